@@ -1,5 +1,4 @@
 from datetime import datetime
-from langchain_openai import ChatOpenAI
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.tools import tool
 from prompts import (
@@ -18,14 +17,29 @@ from tools import (
     create_payment_plan,
     create_escalation_ticket
 )
-from data import ConversationMessage, ConversationState, CUSTOMER_DB
-from typing import Dict
+from data import ConversationMessage, ConversationState
+from cache import customer_cache
+from usage import usage_tracker
+from routing import ModelTier, create_default_router
+from streaming import SentenceStreamHandler
+from summarizer import ConversationSummarizer, format_messages
+from speech import detect_yes_no, extract_digits, extract_date
+from typing import Dict, Iterator, Tuple
+import contextvars
 import os
+import queue
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-llm = ChatOpenAI(model="gpt-4o-mini", api_key=api_key,temperature=0.1)
+model_router = create_default_router(api_key)
+summarizer = ConversationSummarizer(lambda: model_router.model_for("summarizer"))
+
+# Number of recent messages sent verbatim to the orchestrator; older ones reach it through the summary
+HISTORY_WINDOW = 10
+# Settle clear verification answers from the transcript instead of asking the models
+LOCAL_VERIFICATION = os.getenv("LOCAL_VERIFICATION", "true").lower() == "true"
 
 # Verification Agent Tools
 verification_tools = [verify_customer_identity]
@@ -46,7 +60,7 @@ escalation_tools = [create_escalation_ticket]
 @tool
 def call_verification_agent(customer_phone: str, task: str, verification_data: str = "") -> str:
     """Call verification agent to handle customer identity verification tasks."""
-    verification_agent = create_tool_calling_agent(llm, verification_tools, VERIFICATION_PROMPT)
+    verification_agent = create_tool_calling_agent(model_router.model_for("verification"), verification_tools, VERIFICATION_PROMPT)
     verification_executor = AgentExecutor(agent=verification_agent, tools=verification_tools, verbose=False)
     
     input_data = {
@@ -56,7 +70,7 @@ def call_verification_agent(customer_phone: str, task: str, verification_data: s
     
     try:
         print(f"Calling verification agent with input: {input_data}")
-        result = verification_executor.invoke(input_data)
+        result = verification_executor.invoke(input_data, config=usage_tracker.config("verification"))
         return result.get("output", "Verification agent completed the task.")
     except Exception as e:
         return f"Verification agent error: {str(e)}"
@@ -64,7 +78,7 @@ def call_verification_agent(customer_phone: str, task: str, verification_data: s
 @tool
 def call_emi_reminder_agent(customer_phone: str, task: str) -> str:
     """Call EMI reminder agent to handle payment reminders and due date information."""
-    emi_agent = create_tool_calling_agent(llm, emi_reminder_tools, EMI_REMINDER_PROMPT)
+    emi_agent = create_tool_calling_agent(model_router.model_for("emi_reminder"), emi_reminder_tools, EMI_REMINDER_PROMPT)
     emi_executor = AgentExecutor(agent=emi_agent, tools=emi_reminder_tools, verbose=False)
     
     input_data = {
@@ -74,7 +88,7 @@ def call_emi_reminder_agent(customer_phone: str, task: str) -> str:
     
     try:
         print(f"Calling EMI reminder agent with input: {input_data}")
-        result = emi_executor.invoke(input_data)
+        result = emi_executor.invoke(input_data, config=usage_tracker.config("emi_reminder"))
         return result.get("output", "EMI reminder agent completed the task.")
     except Exception as e:
         return f"EMI reminder agent error: {str(e)}"
@@ -82,7 +96,7 @@ def call_emi_reminder_agent(customer_phone: str, task: str) -> str:
 @tool
 def call_payment_collection_agent(customer_phone: str, task: str, amount: float = 0, payment_method: str = "") -> str:
     """Call payment collection agent to handle payment processing and link generation."""
-    payment_agent = create_tool_calling_agent(llm, payment_collection_tools, PAYMENT_COLLECTION_PROMPT)
+    payment_agent = create_tool_calling_agent(model_router.model_for("payment_collection"), payment_collection_tools, PAYMENT_COLLECTION_PROMPT)
     payment_executor = AgentExecutor(agent=payment_agent, tools=payment_collection_tools, verbose=False)
     
     input_data = {
@@ -92,7 +106,7 @@ def call_payment_collection_agent(customer_phone: str, task: str, amount: float
     
     try:
         print(f"Calling payment collection agent with input: {input_data}")
-        result = payment_executor.invoke(input_data)
+        result = payment_executor.invoke(input_data, config=usage_tracker.config("payment_collection"))
         return result.get("output", "Payment collection agent completed the task.")
     except Exception as e:
         return f"Payment collection agent error: {str(e)}"
@@ -100,7 +114,7 @@ def call_payment_collection_agent(customer_phone: str, task: str, amount: float
 @tool  
 def call_payment_plan_agent(customer_phone: str, task: str, monthly_amount: float = 0, start_date: str = "") -> str:
     """Call payment plan agent to handle payment plan creation and options."""
-    plan_agent = create_tool_calling_agent(llm, payment_plan_tools, PAYMENT_PLAN_PROMPT)
+    plan_agent = create_tool_calling_agent(model_router.model_for("payment_plan"), payment_plan_tools, PAYMENT_PLAN_PROMPT)
     plan_executor = AgentExecutor(agent=plan_agent, tools=payment_plan_tools, verbose=False)
     
     input_data = {
@@ -110,7 +124,7 @@ def call_payment_plan_agent(customer_phone: str, task: str, monthly_amount: floa
     
     try:
         print(f"Calling payment plan agent with input: {input_data}")
-        result = plan_executor.invoke(input_data)
+        result = plan_executor.invoke(input_data, config=usage_tracker.config("payment_plan"))
         return result.get("output", "Payment plan agent completed the task.")
     except Exception as e:
         return f"Payment plan agent error: {str(e)}"
@@ -118,7 +132,7 @@ def call_payment_plan_agent(customer_phone: str, task: str, monthly_amount: floa
 @tool
 def call_escalation_agent(customer_phone: str, reason: str, details: str) -> str:
     """Call escalation agent to handle customer escalations and logging."""
-    escalation_agent = create_tool_calling_agent(llm, escalation_tools, ESCALATION_PROMPT)
+    escalation_agent = create_tool_calling_agent(model_router.model_for("escalation"), escalation_tools, ESCALATION_PROMPT)
     escalation_executor = AgentExecutor(agent=escalation_agent, tools=escalation_tools, verbose=False)
     
     input_data = {
@@ -128,7 +142,7 @@ def call_escalation_agent(customer_phone: str, reason: str, details: str) -> str
     
     try:
         print(f"Calling escalation agent with input: {input_data}")
-        result = escalation_executor.invoke(input_data)
+        result = escalation_executor.invoke(input_data, config=usage_tracker.config("escalation"))
         return result.get("output", "Escalation agent completed the task.")
     except Exception as e:
         return f"Escalation agent error: {str(e)}"
@@ -142,9 +156,12 @@ orchestrator_tools = [
     call_escalation_agent
 ]
 
-def create_orchestrator_agent():
-    """Create the main orchestrator agent."""
-    orchestrator = create_tool_calling_agent(llm, orchestrator_tools, ORCHESTRATOR_PROMPT)
+def create_orchestrator_agent(tier: ModelTier, streaming: bool = False):
+    """Create the main orchestrator agent on the given model tier."""
+    model = tier.model
+    if streaming:
+        model = model.model_copy(update={"streaming": True})
+    orchestrator = create_tool_calling_agent(model, orchestrator_tools, ORCHESTRATOR_PROMPT)
     orchestrator_executor = AgentExecutor(
         agent=orchestrator, 
         tools=orchestrator_tools, 
@@ -154,22 +171,41 @@ def create_orchestrator_agent():
     )
     return orchestrator_executor
 
+# Building an executor costs far more CPU than a turn's own bookkeeping, so each (tier, streaming)
+# pair gets one, shared by every call. Per-turn callbacks travel in the invoke config instead.
+_orchestrators: Dict[Tuple[str, bool], Tuple[ModelTier, AgentExecutor]] = {}
+_orchestrators_lock = threading.Lock()
+
+def get_orchestrator_agent(streaming: bool = False) -> AgentExecutor:
+    """The cached orchestrator for the tier currently routed to it, so failover takes effect on the next turn."""
+    tier = model_router.tier_for("orchestrator")
+    key = (tier.name, streaming)
+    cached = _orchestrators.get(key)
+    if cached is None or cached[0] is not tier:
+        with _orchestrators_lock:
+            cached = _orchestrators.get(key)
+            # Also rebuilt when the router itself was replaced with new tiers of the same name
+            if cached is None or cached[0] is not tier:
+                cached = (tier, create_orchestrator_agent(tier, streaming))
+                _orchestrators[key] = cached
+    return cached[1]
+
 class LoanAdvisorSystem:
     def __init__(self):
-        self.orchestrator = create_orchestrator_agent()
+        # Keyed by CallSid so two calls to the same number never share state
         self.conversation_states: Dict[str, ConversationState] = {}
     
-    def start_conversation(self, customer_phone: str) -> str:
-        """Start a new conversation with a customer."""
+    def start_conversation(self, call_sid: str, customer_phone: str) -> str:
+        """Start a new conversation with a customer on call `call_sid`."""
         # Initialize conversation state
         state = ConversationState(
             customer_phone=customer_phone,
             current_step="initial"
         )
-        self.conversation_states[customer_phone] = state
+        self.conversation_states[call_sid] = state
         
         # Get customer info for greeting
-        customer = CUSTOMER_DB.get(customer_phone)
+        customer = customer_cache.get(customer_phone)
         
         if not customer:
             return f"I'm sorry, but I couldn't find a customer record for the phone number {customer_phone}. Please contact our customer service team for assistance."
@@ -181,27 +217,25 @@ class LoanAdvisorSystem:
         state.current_step = "name_verification"
 
         # Add initial message to conversation history
-        self._add_message_to_history(customer_phone, "assistant", greeting, "name_verification")
+        self._add_message_to_history(call_sid, "assistant", greeting, "name_verification")
         return greeting
     
-    def continue_conversation(self, customer_phone: str, user_input: str) -> str:
-        """Continue an existing conversation."""
-        if customer_phone not in self.conversation_states:
-            return "I'm sorry, but I don't have an active conversation for this number. Please restart the call."
-        
-        state = self.conversation_states[customer_phone]
+    def _prepare_turn(self, call_sid: str, user_input: str) -> dict:
+        """Record the user's input and build the orchestrator input for this turn."""
+        state = self.conversation_states[call_sid]
         state.user_response = user_input
         
         # Add user message to conversation history
-        self._add_message_to_history(customer_phone, "user", user_input, state.current_step)
+        self._add_message_to_history(call_sid, "user", user_input, state.current_step)
+        verification_note = self._verify_locally(call_sid, user_input) if LOCAL_VERIFICATION else ""
         
         # Format conversation history for context
-        formatted_history = self._format_conversation_history(customer_phone)
+        formatted_history = self._format_conversation_history(call_sid)
         
         # Prepare input for orchestrator with full context
         conversation_context = {
             "input": user_input,
-            "customer_phone": customer_phone,
+            "customer_phone": state.customer_phone,
             "conversation_state": {
                 "current_step": state.current_step,
                 "verification_status": state.verification_status,
@@ -212,28 +246,129 @@ class LoanAdvisorSystem:
                 "next_emi_amount": state.customer.next_emi_amount if state.customer else 0,
                 "next_due_date": state.customer.next_due_date if state.customer else ""
             },
+            "context_summary": state.context_summary or "None",
             "conversation_history": formatted_history
         }
-        
+        if verification_note:
+            conversation_context["conversation_state"]["verification_note"] = verification_note
+        spoken_date = extract_date(user_input)
+        if spoken_date.confident:
+            conversation_context["conversation_state"]["spoken_date"] = spoken_date.value
+        return conversation_context
+
+    def _verify_locally(self, call_sid: str, user_input: str) -> str:
+        """Settle a clear verification answer without a model call; returns a note for the orchestrator.
+
+        Only the customer's first answer in a verification step is parsed. The local path can confirm an
+        SSN but never fails one; mismatches and anything unclear are left to the orchestrator.
+        """
+        state = self.conversation_states[call_sid]
+        if state.verification_status != "pending" or not state.customer:
+            return ""
+        answers = sum(1 for msg in state.conversation_history if msg.role == "user" and msg.step == state.current_step)
+        if answers != 1:
+            return ""
+
+        if state.current_step == "name_verification":
+            intent = detect_yes_no(user_input)
+            if not intent.confident:
+                return ""
+            if intent.value:
+                state.verification_status = "verified"
+                state.current_step = "emi_reminder"
+                print(f"⚡ Call {call_sid}: name confirmed locally")
+                return "Customer confirmed their name, identity is verified. Give the EMI reminder now."
+            state.current_step = "ssn_verification"
+            print(f"⚡ Call {call_sid}: name denied locally, asking for SSN")
+            return "Customer did not confirm their name. Ask for the last 4 digits of their SSN."
+
+        if state.current_step == "ssn_verification":
+            digits = extract_digits(user_input, length=4)
+            if not digits.confident:
+                return ""
+            result = verify_customer_identity.invoke({"phone": state.customer_phone, "verification_data": digits.value})
+            if not result["success"]:
+                # The transcript may have been misheard; a mismatch is for the verification agent to judge
+                print(f"⚡ Call {call_sid}: local SSN parse did not match, leaving verification to the agents")
+                return ""
+            print(f"⚡ Call {call_sid}: SSN verified locally")
+            state.verification_status = "verified"
+            state.current_step = "emi_reminder"
+            return "SSN last 4 digits matched, identity is verified. Give the EMI reminder now."
+
+        return ""
+
+    def continue_conversation(self, call_sid: str, user_input: str) -> str:
+        """Continue an existing conversation."""
+        if call_sid not in self.conversation_states:
+            return "I'm sorry, but I don't have an active conversation for this call. Please restart the call."
+
+        state = self.conversation_states[call_sid]
+        conversation_context = self._prepare_turn(call_sid, user_input)
+
         try:
             print("Calling orchestrator with context:", conversation_context)
-            result = self.orchestrator.invoke(conversation_context)
+            with usage_tracker.step(state.current_step):
+                orchestrator = get_orchestrator_agent()
+                result = orchestrator.invoke(conversation_context, config=usage_tracker.config("orchestrator"))
             response = result.get("output", "I apologize, but I'm having trouble processing your request right now.")
 
             # Add AI response to conversation history
-            self._add_message_to_history(customer_phone, "assistant", response, state.current_step)
+            self._add_message_to_history(call_sid, "assistant", response, state.current_step)
             return response
             
         except Exception as e:
             error_msg = f"I apologize for the technical difficulty. Please contact our customer service team. Error: {str(e)}"
-            self._add_message_to_history(customer_phone, "assistant", error_msg, "error")
+            self._add_message_to_history(call_sid, "assistant", error_msg, "error")
             return error_msg
-    def _add_message_to_history(self, customer_phone: str, role: str, content: str, step: str = ""):
+
+    def stream_conversation(self, call_sid: str, user_input: str) -> Iterator[str]:
+        """Continue an existing conversation, yielding the response sentence by sentence as it is generated."""
+        if call_sid not in self.conversation_states:
+            yield "I'm sorry, but I don't have an active conversation for this call. Please restart the call."
+            return
+
+        state = self.conversation_states[call_sid]
+        conversation_context = self._prepare_turn(call_sid, user_input)
+        events: queue.Queue = queue.Queue()
+        handler = SentenceStreamHandler(events)
+
+        def run_orchestrator():
+            try:
+                with usage_tracker.step(state.current_step):
+                    orchestrator = get_orchestrator_agent(streaming=True)
+                    config = usage_tracker.config("orchestrator", [handler])
+                    result = orchestrator.invoke(conversation_context, config=config)
+                events.put(("done", result.get("output", "I apologize, but I'm having trouble processing your request right now.")))
+            except Exception as e:
+                events.put(("error", e))
+
+        # Carry the caller's context (CallSid for usage accounting) into the worker thread
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(run_orchestrator,), daemon=True)
+        worker.start()
+
+        while True:
+            kind, payload = events.get()
+            if kind == "sentence":
+                yield payload
+            elif kind == "done":
+                if not handler.streamed_any:
+                    # The model did not stream (e.g. it does not support it); speak the final output instead
+                    yield payload
+                self._add_message_to_history(call_sid, "assistant", payload, state.current_step)
+                return
+            else:
+                error_msg = f"I apologize for the technical difficulty. Please contact our customer service team. Error: {str(payload)}"
+                self._add_message_to_history(call_sid, "assistant", error_msg, "error")
+                yield error_msg
+                return
+
+    def _add_message_to_history(self, call_sid: str, role: str, content: str, step: str = ""):
         """Add a message to the conversation history."""
-        if customer_phone not in self.conversation_states:
+        state = self.conversation_states.get(call_sid)
+        if state is None:
             return
-        
-        state = self.conversation_states[customer_phone]
+
         message = ConversationMessage(
             role=role,
             content=content,
@@ -242,55 +377,25 @@ class LoanAdvisorSystem:
         )
         state.conversation_history.append(message)
         
-        # Update context summary periodically
-        if len(state.conversation_history) % 4 == 0:  # Every 4 messages
-            self._update_context_summary(customer_phone)
+        # Fold messages that just left the history window into the rolling summary
+        summarizer.maybe_summarize(call_sid, state, HISTORY_WINDOW)
 
-    def _format_conversation_history(self, customer_phone: str, max_messages: int = 10) -> str:
+    def _format_conversation_history(self, call_sid: str, max_messages: int = HISTORY_WINDOW) -> str:
         """Format conversation history for the orchestrator."""
-        if customer_phone not in self.conversation_states:
+        state = self.conversation_states.get(call_sid)
+        if state is None:
             return ""
-        
-        state = self.conversation_states[customer_phone]
-        # Get recent messages (limit to prevent token overflow)
-        recent_messages = state.conversation_history[-max_messages:]
-        
-        formatted = []
-        for msg in recent_messages:
-            role_prefix = "AI" if msg.role == "assistant" else "Customer"
-            step_info = f" [{msg.step}]" if msg.step else ""
-            formatted.append(f"{role_prefix}{step_info}: {msg.content}")
-        
-        return "\n".join(formatted)
-    
-    def _update_context_summary(self, customer_phone: str):
-        """Update context summary of the conversation."""
-        if customer_phone not in self.conversation_states:
-            return
-        
-        state = self.conversation_states[customer_phone]
-        
-        # Create a simple context summary
-        summary_parts = []
-        
-        if state.verification_status == "verified":
-            summary_parts.append("Customer identity verified")
-        elif state.verification_status == "failed":
-            summary_parts.append("Customer verification failed")
-        
-        if state.current_step == "emi_reminder":
-            summary_parts.append("EMI reminder provided")
-        elif state.current_step == "payment_collection":
-            summary_parts.append("Payment collection in progress")
-        elif state.current_step == "payment_plan":
-            summary_parts.append("Payment plan discussion")
-        
-        if state.escalation_needed:
-            summary_parts.append("Escalation required")
-        
-        state.context_summary = " | ".join(summary_parts)
+
+        history = state.conversation_history
+        # Recent messages plus any that left the window but are not in the summary yet,
+        # capped so a lagging summarizer cannot grow the prompt without bound
+        window_start = max(0, len(history) - max_messages)
+        window_start = max(min(window_start, state.summarized_count), len(history) - 2 * max_messages, 0)
+        summarizer.record_prompt(state, window_start)
+
+        return format_messages(history[window_start:])
     
-    def end_conversation(self, customer_phone: str):
+    def end_conversation(self, call_sid: str):
         """End and cleanup conversation."""
-        if customer_phone in self.conversation_states:
-            del self.conversation_states[customer_phone]
\ No newline at end of file
+        self.conversation_states.pop(call_sid, None)
+        summarizer.cancel(call_sid)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from data import Customer, CUSTOMER_DB
+
+CUSTOMER_CACHE_TTL = float(os.getenv('CUSTOMER_CACHE_TTL', '300'))
+CUSTOMER_CACHE_SIZE = int(os.getenv('CUSTOMER_CACHE_SIZE', '10000'))
+
+
+class _Flight:
+    """A backend load in progress that concurrent misses for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Customer] = None
+        self.error: Optional[BaseException] = None
+
+
+class CustomerCache:
+    """Read-through TTL + LRU cache for customer records with single-flight loading."""
+
+    def __init__(self, loader: Callable[[str], Optional[Customer]],
+                 ttl: float = CUSTOMER_CACHE_TTL, max_size: int = CUSTOMER_CACHE_SIZE):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'load_errors': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, phone: str) -> Optional[Customer]:
+        """Return the customer for `phone`, loading it from the backend on a miss."""
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is not None:
+                expires_at, customer = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(phone)
+                    self._stats['hits'] += 1
+                    return customer
+                del self._entries[phone]
+                self._stats['expirations'] += 1
+
+            self._stats['misses'] += 1
+            flight = self._inflight.get(phone)
+            if flight is not None:
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                flight = self._inflight[phone] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            customer = self.loader(phone)
+            flight.result = customer
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats['load_errors'] += 1
+                # invalidate() or clear() may have detached this flight while it was loading
+                if self._inflight.get(phone) is flight:
+                    del self._inflight[phone]
+            raise
+        else:
+            with self._lock:
+                self._stats['loads'] += 1
+                # A record invalidated while it was loading must not be cached
+                if customer is not None and self._inflight.get(phone) is flight:
+                    self._entries[phone] = (time.monotonic() + self.ttl, customer)
+                    self._entries.move_to_end(phone)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                        self._stats['evictions'] += 1
+                if self._inflight.get(phone) is flight:
+                    del self._inflight[phone]
+        finally:
+            # Waiters must always be released, whatever happened above
+            flight.done.set()
+        return customer
+
+    def invalidate(self, phone: str):
+        """Drop a customer record, e.g. after a payment or plan changes its balance."""
+        with self._lock:
+            if self._entries.pop(phone, None) is not None:
+                self._stats['invalidations'] += 1
+            # Detach any in-flight load so its (possibly stale) result is not cached
+            self._inflight.pop(phone, None)
+
+    def clear(self):
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self._inflight.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        # Every lookup that did not turn into a backend load was taken off the backend
+        stats['backend_calls_saved'] = lookups - stats['loads'] - stats['load_errors']
+        return stats
+
+
+customer_cache = CustomerCache(CUSTOMER_DB.get)
@@ -14,6 +14,10 @@ class Customer:
     next_due_date: str
     late_fee: float
     interest_rate: float
+    # Campaign calling window in the customer's local hours (end exclusive); unset uses CALL_WINDOW_START/END
+    call_window_start: Optional[int] = None
+    call_window_end: Optional[int] = None
+    timezone: str = ""  # IANA name, e.g. "Asia/Kolkata"; empty means the server's local time
 
 @dataclass
 class ConversationMessage:
@@ -34,6 +38,7 @@ class ConversationState:
     conversation_complete: bool = False
     conversation_history: list = None
     context_summary: str = ""
+    summarized_count: int = 0  # messages at the start of conversation_history folded into context_summary
     
     def __post_init__(self):
         if self.conversation_history is None:
@@ -52,7 +57,8 @@ CUSTOMER_DB = {
         next_emi_amount=750.0,
         next_due_date="2025-06-28",
         late_fee=50.0,
-        interest_rate=12.5
+        interest_rate=12.5,
+        timezone="Asia/Kolkata"
     ),
     "+1234567891": Customer(
         customer_id="CUST002",
@@ -65,7 +71,8 @@ CUSTOMER_DB = {
         next_emi_amount=425.0,
         next_due_date="2025-07-20",
         late_fee=35.0,
-        interest_rate=11.0
+        interest_rate=11.0,
+        timezone="America/New_York"
     ),
     "+1234567892": Customer(
         customer_id="CUST003",
@@ -78,6 +85,7 @@ CUSTOMER_DB = {
         next_emi_amount=1100.0,
         next_due_date="2025-06-18",
         late_fee=75.0,
-        interest_rate=13.0
+        interest_rate=13.0,
+        timezone="America/New_York"
     )
 }
\ No newline at end of file
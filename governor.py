@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from usage import UsageTracker, current_call_sid
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '500'))
+LLM_TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', '200000'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '32'))
+# Completion tokens reserved per request until the real usage is known
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv('LLM_EXPECTED_COMPLETION_TOKENS', '300'))
+
+# Lower runs first. Sub-agents share the orchestrator's class: they finish turns a caller is waiting on.
+AGENT_PRIORITY = {"summarizer": 1}
+PRIORITY_CLASSES = 2
+
+
+class TokenBucket:
+    """Refills continuously up to `capacity` per minute; may go into debt when usage is reconciled."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        # A request larger than the whole bucket is let through once the bucket is full
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+
+class _Waiter:
+    def __init__(self, call_sid: str, agent: str, priority: int, tokens: int):
+        self.call_sid = call_sid
+        self.agent = agent
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = 0.0
+
+
+class LLMGovernor(BaseCallbackHandler):
+    """Process-wide admission control for model requests.
+
+    Each request waits for a concurrency slot, one request from the per-minute request bucket and its
+    estimated tokens from the per-minute token bucket. Waiters are served by priority class, and
+    round-robin across CallSids within a class, so one busy call cannot starve the others.
+    Attach it to a model's callbacks ahead of anything that times the request.
+    """
+
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 expected_completion_tokens: int = LLM_EXPECTED_COMPLETION_TOKENS):
+        self.max_concurrency = max_concurrency
+        self.expected_completion_tokens = expected_completion_tokens
+        self._cond = threading.Condition()
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._queues: List["OrderedDict[str, deque]"] = [OrderedDict() for _ in range(PRIORITY_CLASSES)]
+        self._waiting = 0
+        self._inflight: Dict[UUID, _Waiter] = {}
+        self._wait_times: Dict[str, deque] = {}
+        self._model_times: Dict[str, deque] = {}
+        self._stats = {'admitted': 0, 'completed': 0, 'failed': 0, 'queued': 0, 'peak_waiting': 0}
+
+    def _estimate_tokens(self, messages) -> int:
+        prompt_chars = sum(len(str(message.content)) for batch in messages for message in batch)
+        return prompt_chars // 4 + self.expected_completion_tokens
+
+    def _head(self) -> Optional[_Waiter]:
+        for queue in self._queues:
+            if queue:
+                return next(iter(queue.values()))[0]
+        return None
+
+    def _dequeue(self, waiter: _Waiter):
+        queue = self._queues[waiter.priority]
+        waiters = queue[waiter.call_sid]
+        waiters.popleft()
+        if waiters:
+            # Round-robin: this call goes behind every other call waiting in its class
+            queue.move_to_end(waiter.call_sid)
+        else:
+            del queue[waiter.call_sid]
+        self._waiting -= 1
+
+    def _admit_delay(self, waiter: _Waiter) -> Optional[float]:
+        """0 if `waiter` may start now, seconds until a bucket refills, or None to wait for a release."""
+        if self._head() is not waiter or len(self._inflight) >= self.max_concurrency:
+            return None
+        now = time.monotonic()
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        return max(self._requests.seconds_until(1), self._tokens.seconds_until(waiter.tokens))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        agent = (metadata or {}).get("agent", "unknown")
+        waiter = _Waiter(current_call_sid(), agent, AGENT_PRIORITY.get(agent, 0), self._estimate_tokens(messages))
+
+        with self._cond:
+            self._queues[waiter.priority].setdefault(waiter.call_sid, deque()).append(waiter)
+            self._waiting += 1
+            self._stats['peak_waiting'] = max(self._stats['peak_waiting'], self._waiting)
+            queued = False
+            while True:
+                delay = self._admit_delay(waiter)
+                if delay == 0:
+                    break
+                queued = True
+                self._cond.wait(timeout=delay)
+
+            self._dequeue(waiter)
+            self._requests.level -= 1
+            self._tokens.level -= waiter.tokens
+            waiter.admitted_at = time.monotonic()
+            self._inflight[run_id] = waiter
+            self._stats['admitted'] += 1
+            self._stats['queued'] += queued
+            self._wait_times.setdefault(agent, deque(maxlen=1000)).append(waiter.admitted_at - waiter.enqueued_at)
+            # The next waiter may fit in the capacity that is still free
+            self._cond.notify_all()
+
+    def _release(self, run_id: UUID, used_tokens: Optional[int], ok: bool):
+        with self._cond:
+            waiter = self._inflight.pop(run_id, None)
+            if waiter is None:
+                return
+            if used_tokens:
+                # Settle the estimate against what the provider actually counted
+                self._tokens.level += waiter.tokens - used_tokens
+            self._stats['completed' if ok else 'failed'] += 1
+            self._model_times.setdefault(waiter.agent, deque(maxlen=1000)).append(time.monotonic() - waiter.admitted_at)
+            self._cond.notify_all()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        prompt_tokens, completion_tokens, _ = UsageTracker._extract_usage(response)
+        self._release(run_id, prompt_tokens + completion_tokens, ok=True)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._release(run_id, None, ok=False)
+
+    def stats(self) -> Dict[str, object]:
+        """Queue wait and model time per agent, reported separately, plus current load."""
+        with self._cond:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            stats = dict(self._stats)
+            stats['waiting'] = self._waiting
+            stats['inflight'] = len(self._inflight)
+            stats['max_concurrency'] = self.max_concurrency
+            stats['requests_available'] = round(self._requests.level, 1)
+            stats['tokens_available'] = round(self._tokens.level)
+            wait_times = {agent: sorted(times) for agent, times in self._wait_times.items()}
+            model_times = {agent: sorted(times) for agent, times in self._model_times.items()}
+
+        stats['by_agent'] = {
+            agent: {
+                'avg_wait': _average(wait_times.get(agent)),
+                'p95_wait': _p95(wait_times.get(agent)),
+                'avg_model_time': _average(model_times.get(agent)),
+                'p95_model_time': _p95(model_times.get(agent)),
+            }
+            for agent in sorted(set(wait_times) | set(model_times))
+        }
+        return stats
+
+
+def _average(values: Optional[List[float]]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def _p95(values: Optional[List[float]]) -> float:
+    return values[int(0.95 * (len(values) - 1))] if values else 0.0
+
+
+llm_governor = LLMGovernor()
@@ -0,0 +1,304 @@
+import argparse
+import csv
+import gc
+import io
+import json
+import os
+import random
+import tempfile
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import MISSING, fields
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from cache import customer_cache
+from data import Customer, CUSTOMER_DB
+
+INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', '50000'))
+
+CUSTOMER_FIELDS = [f.name for f in fields(Customer)]
+FLOAT_FIELDS = {f.name for f in fields(Customer) if f.type in (float, 'float')}
+INT_FIELDS = {f.name for f in fields(Customer) if f.type in (int, Optional[int], 'int', 'Optional[int]')}
+# Fields with a default (e.g. the calling window) may be missing or empty in an export
+FIELD_DEFAULTS = {f.name: f.default for f in fields(Customer) if f.default is not MISSING}
+REQUIRED_FIELDS = frozenset(name for name in CUSTOMER_FIELDS if name not in FIELD_DEFAULTS)
+
+
+def _coerce(name: str, value):
+    if name in FIELD_DEFAULTS and value in (None, ''):
+        return FIELD_DEFAULTS[name]
+    if name in FLOAT_FIELDS:
+        return float(value)
+    if name in INT_FIELDS:
+        return int(value)
+    return str(value)
+
+
+def _converter(name: str):
+    if name in FIELD_DEFAULTS:
+        return lambda value: _coerce(name, value)
+    return float if name in FLOAT_FIELDS else str
+
+
+CONVERTERS = [_converter(name) for name in CUSTOMER_FIELDS]
+
+
+def _row_to_customer(row: Dict[str, object]) -> Customer:
+    return Customer(**{name: _coerce(name, row[name] if name in REQUIRED_FIELDS else row.get(name))
+                       for name in CUSTOMER_FIELDS})
+
+
+def _parse_chunk(fmt: str, header: Optional[List[str]], lines: List[str]) -> List[list]:
+    """Parse raw export lines into typed field values in Customer field order.
+
+    Runs in worker processes when workers > 1; plain lists pickle far faster than dataclasses.
+    """
+    if fmt == 'csv':
+        # Optional columns absent from the header read as empty, which converts to the field default
+        columns = [header.index(name) if name in header or name in REQUIRED_FIELDS else None
+                   for name in CUSTOMER_FIELDS]
+        return [
+            [convert(values[i] if i is not None else '') for convert, i in zip(CONVERTERS, columns)]
+            for values in csv.reader(lines)
+        ]
+    return [
+        [convert(row[name] if name in REQUIRED_FIELDS else row.get(name))
+         for convert, name in zip(CONVERTERS, CUSTOMER_FIELDS)]
+        for row in map(json.loads, lines)
+    ]
+
+
+def _detect_format(path: str) -> str:
+    if path.endswith('.json'):
+        # A .json export may be a single JSON array or JSON lines; look at the first character
+        with open(path) as f:
+            while True:
+                char = f.read(1)
+                if not char or not char.isspace():
+                    break
+        return 'json' if char == '[' else 'jsonl'
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def _iter_line_chunks(f, chunk_size: int) -> Iterator[List[str]]:
+    """Yield non-empty lines in lists of `chunk_size`; exports must not embed newlines inside fields."""
+    chunk = []
+    for line in f:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_customers(path: str, chunk_size: int = INGEST_CHUNK_SIZE, workers: int = 1) -> Iterator[List[Customer]]:
+    """Stream a CSV or JSON-lines portfolio export as chunks of Customer records.
+
+    At most `workers * 2` chunks are in memory at a time, whatever the file size. A JSON array
+    export is also accepted, but it is read into memory whole and parsed in this process.
+    """
+    fmt = _detect_format(path)
+    if fmt == 'json':
+        with open(path) as f:
+            rows = json.load(f)
+        if not isinstance(rows, list):
+            raise ValueError(f"{path}: expected a JSON array of customer records")
+        for start in range(0, len(rows), chunk_size):
+            yield [_row_to_customer(row) for row in rows[start:start + chunk_size]]
+        return
+
+    with open(path, newline='') as f:
+        header = next(csv.reader([f.readline()])) if fmt == 'csv' else None
+        chunks = _iter_line_chunks(f, chunk_size)
+
+        if workers <= 1:
+            for lines in chunks:
+                yield [Customer(*row) for row in _parse_chunk(fmt, header, lines)]
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for lines in chunks:
+                pending.append(pool.submit(_parse_chunk, fmt, header, lines))
+                if len(pending) >= workers * 2:
+                    yield [Customer(*row) for row in pending.pop(0).result()]
+            for future in pending:
+                yield [Customer(*row) for row in future.result()]
+
+
+def load_portfolio(path: str, target: Dict[str, Customer] = CUSTOMER_DB, chunk_size: int = INGEST_CHUNK_SIZE,
+                   workers: int = 1, prune: bool = False) -> int:
+    """Upsert every customer in a full export into `target`; with `prune`, drop customers missing from it."""
+    loaded = 0
+    seen = set() if prune else None
+    # Millions of new records would otherwise trigger many full GC passes over the whole heap
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for customers in iter_customers(path, chunk_size, workers):
+            for customer in customers:
+                target[customer.phone] = customer
+                if seen is not None:
+                    seen.add(customer.phone)
+            loaded += len(customers)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    if seen is not None:
+        for phone in [phone for phone in target if phone not in seen]:
+            del target[phone]
+    customer_cache.clear()
+    return loaded
+
+
+def _parse_delta(line: str) -> tuple:
+    """Validate one delta line into (op, phone, payload) without touching any data."""
+    delta = json.loads(line)
+    if not isinstance(delta, dict) or not delta.get('phone'):
+        raise ValueError("missing 'phone'")
+    phone = str(delta.pop('phone'))
+    op = delta.pop('op', 'update')
+
+    if op == 'delete':
+        return op, phone, None
+    if op == 'upsert':
+        missing = [name for name in CUSTOMER_FIELDS
+                   if name in REQUIRED_FIELDS and name != 'phone' and name not in delta]
+        if missing:
+            raise ValueError(f"upsert is missing {', '.join(missing)}")
+        return op, phone, _row_to_customer({**delta, 'phone': phone})
+    if op == 'update':
+        # The phone is the record's key, so it cannot be changed by an update
+        return op, phone, {name: _coerce(name, value) for name, value in delta.items()
+                           if name in CUSTOMER_FIELDS and name != 'phone'}
+    raise ValueError(f"unknown op '{op}'")
+
+
+def apply_delta_lines(lines: Iterable[str], target: Dict[str, Customer] = CUSTOMER_DB) -> Dict[str, int]:
+    """Apply intraday JSON-lines deltas in place, all or nothing.
+
+    Each line has a `phone`, an optional `op` ("update" by default, "upsert" or "delete") and the
+    changed fields, e.g. {"phone": "+1234567891", "current_balance": 8075.0, "next_due_date": "2025-08-20"}.
+    Every line is validated before any is applied; a bad line raises ValueError naming its line number.
+    """
+    deltas = []
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            deltas.append(_parse_delta(line))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"line {line_number}: {str(e)}") from e
+
+    counts = {'updated': 0, 'upserted': 0, 'deleted': 0, 'skipped': 0}
+    for op, phone, payload in deltas:
+        if op == 'delete':
+            counts['deleted' if target.pop(phone, None) else 'skipped'] += 1
+        elif op == 'upsert':
+            target[phone] = payload
+            counts['upserted'] += 1
+        else:
+            customer = target.get(phone)
+            if customer is None:
+                counts['skipped'] += 1
+                continue
+            for name, value in payload.items():
+                setattr(customer, name, value)
+            counts['updated'] += 1
+
+        customer_cache.invalidate(phone)
+    return counts
+
+
+def apply_deltas(path: str, target: Dict[str, Customer] = CUSTOMER_DB) -> Dict[str, int]:
+    """Apply a JSON-lines delta file in place, without reloading the portfolio."""
+    with open(path) as f:
+        return apply_delta_lines(f, target)
+
+
+def _write_sample_export(path: str, rows: int):
+    """Write a synthetic portfolio export for benchmarking."""
+    fmt = _detect_format(path)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(CUSTOMER_FIELDS)
+        for i in range(rows):
+            record = {
+                'customer_id': f"CUST{i:09d}",
+                'full_name': f"Customer {i}",
+                'phone': f"+1{5550000000 + i}",
+                'date_of_birth': "1985-06-15",
+                'ssn_last_four': f"{i % 10000:04d}",
+                'loan_number': f"LN{i:09d}",
+                'current_balance': round(random.uniform(1000, 50000), 2),
+                'next_emi_amount': round(random.uniform(100, 2000), 2),
+                'next_due_date': "2025-07-20",
+                'late_fee': 50.0,
+                'interest_rate': 12.5,
+                'call_window_start': None,
+                'call_window_end': None,
+                'timezone': "America/New_York",
+            }
+            if writer:
+                writer.writerow(record[name] for name in CUSTOMER_FIELDS)
+            else:
+                f.write(json.dumps(record) + "\n")
+
+
+def benchmark(rows: int, chunk_size: int, workers: int):
+    """Report load throughput in rows per second for CSV and JSON-lines exports."""
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('portfolio.csv', 'portfolio.jsonl'):
+            path = os.path.join(tmp, name)
+            _write_sample_export(path, rows)
+            target: Dict[str, Customer] = {}
+
+            started = time.perf_counter()
+            loaded = load_portfolio(path, target, chunk_size, workers)
+            elapsed = time.perf_counter() - started
+            # ru_maxrss is reported in KiB on Linux
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+            print(f"📥 {name}: {loaded} rows in {elapsed:.2f}s -> {loaded / elapsed:,.0f} rows/s "
+                  f"(workers={workers}, chunk={chunk_size}, peak RSS {peak_rss:.0f} MiB)")
+
+            deltas = io.StringIO("".join(
+                json.dumps({'phone': f"+1{5550000000 + i}", 'current_balance': 0.0}) + "\n"
+                for i in range(0, rows, 10)
+            ))
+            started = time.perf_counter()
+            counts = apply_delta_lines(deltas, target)
+            elapsed = time.perf_counter() - started
+            print(f"🔁 {counts['updated']} deltas applied in {elapsed:.2f}s "
+                  f"-> {counts['updated'] / elapsed:,.0f} rows/s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Portfolio bulk ingest and delta sync")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    bench = sub.add_parser('bench', help="Benchmark load throughput on a synthetic export")
+    bench.add_argument('--rows', type=int, default=1_000_000)
+    bench.add_argument('--chunk-size', type=int, default=INGEST_CHUNK_SIZE)
+    # Extra workers only pay off when parsing costs more than shipping parsed rows back between processes
+    bench.add_argument('--workers', type=int, default=1)
+
+    validate = sub.add_parser('validate', help="Parse an export and report how many rows it holds")
+    validate.add_argument('path')
+    validate.add_argument('--chunk-size', type=int, default=INGEST_CHUNK_SIZE)
+    validate.add_argument('--workers', type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'bench':
+        benchmark(args.rows, args.chunk_size, args.workers)
+    else:
+        rows = sum(len(chunk) for chunk in iter_customers(args.path, args.chunk_size, args.workers))
+        print(f"✅ {args.path}: {rows} valid rows")
@@ -0,0 +1,466 @@
+import os
+import argparse
+import itertools
+import json
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import simple_websocket
+from werkzeug.serving import make_server
+
+# The app builds its model client at import time, so make sure a key is present
+# even though the fake model below never talks to OpenAI.
+os.environ.setdefault("OPENAI_API_KEY", "sk-loadtest")
+# Keep simulated calls away from the real campaign queue
+os.environ.setdefault("CAMPAIGN_DB_PATH", ":memory:")
+# ...and simulated usage out of the real usage log
+os.environ.setdefault("USAGE_LOG_PATH", os.path.join(tempfile.gettempdir(), f"loadtest_usage_{os.getpid()}.jsonl"))
+
+import agents
+import main
+from routing import ModelRouter, ModelTier
+from governor import LLMGovernor, llm_governor, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_CONCURRENCY
+from data import CUSTOMER_DB
+from usage import usage_tracker
+
+DEFAULT_SCRIPT = [
+    "Yes, speaking",
+    "When is my next payment due?",
+    "I would like to pay it now",
+    "Card please",
+    "No, that's all. Thanks bye",
+]
+
+
+def build_script(turns: int) -> List[str]:
+    """Scripted caller lines for a call of `turns` turns, always ending with a goodbye."""
+    middle = DEFAULT_SCRIPT[:-1]
+    return [middle[i % len(middle)] for i in range(max(0, turns - 1))] + DEFAULT_SCRIPT[-1:]
+
+
+FAKE_REPLIES = [
+    "Thank you for confirming. Your next EMI of 750 dollars is due on the 28th. Would you like to make a payment today?",
+    "Sure, I can help with that. Which payment method would you prefer?",
+    "I have generated a secure payment link for you. It will stay valid for the next 10 minutes.",
+    "Is there anything else I can help you with?",
+]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model stand-in that sleeps for a configurable latency and returns canned replies."""
+
+    latency: float = 0.2
+    jitter: float = 0.05
+    replies: List[str] = FAKE_REPLIES
+    streaming: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency"
+
+    def bind_tools(self, tools, **kwargs):
+        # The fake never emits tool calls, so tool schemas can be ignored.
+        return self
+
+    def _usage(self, messages: List[BaseMessage], text: str) -> dict:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(text) // 4
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        text = random.choice(self.replies)
+        usage = self._usage(messages, text)
+        prompt_tokens, completion_tokens = usage["input_tokens"], usage["output_tokens"]
+        message = AIMessage(content=text, usage_metadata=usage)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }},
+        )
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs):
+        # The first token arrives after ~30% of the total latency; the rest trickle in word by word
+        total = max(0.0, random.gauss(self.latency, self.jitter))
+        text = random.choice(self.replies)
+        words = text.split(" ")
+        time.sleep(total * 0.3)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(total * 0.7 / len(words))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == len(words) - 1 else word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, text)))
+
+
+class LoadStats:
+    """Thread-safe collector for per-endpoint latencies and errors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.peak_active_calls = 0
+        self.peak_conversations = 0
+
+    def record(self, endpoint: str, elapsed: float, ok: bool):
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def sample_state(self):
+        with self._lock:
+            self.peak_active_calls = max(self.peak_active_calls, len(main.call_state.active_calls))
+            self.peak_conversations = max(
+                self.peak_conversations,
+                len(main.call_state.advisor_system.conversation_states)
+            )
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def post(client, stats: LoadStats, endpoint: str, form: Dict[str, str]) -> Optional[str]:
+    """POST a Twilio-style form to the app and record the outcome."""
+    started = time.perf_counter()
+    try:
+        resp = client.post(endpoint, data=form)
+        ok = resp.status_code == 200
+        body = resp.get_data(as_text=True)
+        if endpoint != '/voice/status' and "error" in body.lower():
+            ok = False
+    except Exception:
+        ok = False
+        body = None
+    stats.record(endpoint, time.perf_counter() - started, ok)
+    return body
+
+
+def simulate_call(customer_phone: str, script: List[str], stats: LoadStats, think_time: float):
+    """Play Twilio's part for a single call: start, scripted turns, status callback."""
+    client = main.app.test_client()
+    call_sid = f"CA{uuid.uuid4().hex}"
+    base_form = {'CallSid': call_sid, 'To': customer_phone, 'From': main.TWILIO_PHONE_NUMBER}
+
+    post(client, stats, '/voice/status', {**base_form, 'CallStatus': 'ringing'})
+    post(client, stats, '/voice/start', base_form)
+    stats.sample_state()
+
+    for speech in script:
+        if think_time:
+            time.sleep(random.uniform(0, think_time))
+        body = post(client, stats, '/voice/process', {**base_form, 'SpeechResult': speech})
+        stats.sample_state()
+        if body and '<Hangup' in body:
+            break
+
+    post(client, stats, '/voice/status', {**base_form, 'CallStatus': 'completed'})
+
+
+def simulate_relay_call(ws_url: str, customer_phone: str, script: List[str], stats: LoadStats, think_time: float):
+    """Play Twilio ConversationRelay's part: connect a WebSocket, send prompts, time the streamed sentences."""
+    client = main.app.test_client()
+    call_sid = f"CA{uuid.uuid4().hex}"
+    base_form = {'CallSid': call_sid, 'To': customer_phone, 'From': main.TWILIO_PHONE_NUMBER}
+
+    post(client, stats, '/voice/start', base_form)
+    stats.sample_state()
+
+    ws = simple_websocket.Client(f"{ws_url}/voice/relay")
+    try:
+        ws.send(json.dumps({'type': 'setup', 'callSid': call_sid, 'from': main.TWILIO_PHONE_NUMBER, 'to': customer_phone}))
+        ended = False
+        for speech in script:
+            if think_time:
+                time.sleep(random.uniform(0, think_time))
+            started = time.perf_counter()
+            first_sentence = True
+            ws.send(json.dumps({'type': 'prompt', 'voicePrompt': speech, 'last': True}))
+            while True:
+                raw = ws.receive(timeout=60)
+                if raw is None:
+                    stats.record('relay full turn', time.perf_counter() - started, False)
+                    ended = True
+                    break
+                message = json.loads(raw)
+                if message['type'] == 'end':
+                    ended = True
+                    break
+                if first_sentence and message['token'].strip():
+                    stats.record('relay first sentence', time.perf_counter() - started, True)
+                    first_sentence = False
+                if message['last']:
+                    stats.record('relay full turn', time.perf_counter() - started, True)
+                    break
+            stats.sample_state()
+            if ended:
+                break
+    except simple_websocket.ConnectionClosed:
+        # The server closes the socket once it hangs up
+        pass
+    finally:
+        ws.close()
+
+    post(client, stats, '/voice/status', {**base_form, 'CallStatus': 'completed'})
+
+
+def start_local_server():
+    """Serve the app on a free local port so WebSocket clients can connect to it."""
+    server = make_server('127.0.0.1', 0, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"ws://127.0.0.1:{server.port}"
+
+
+def install_fake_router(latency: float, fast_latency: float, jitter: float, latency_threshold: float,
+                        governor: LLMGovernor = llm_governor):
+    """Route every agent to fake model tiers of different speeds."""
+    agents.model_router = ModelRouter([
+        ModelTier("primary", FakeChatModel(latency=latency, jitter=jitter), latency_threshold=latency_threshold,
+                  governor=governor),
+        ModelTier("fast", FakeChatModel(latency=fast_latency, jitter=jitter), latency_threshold=latency_threshold,
+                  governor=governor),
+    ])
+
+
+def run(calls: int, concurrency: int, latency: float, jitter: float, think_time: float,
+        fast_latency: Optional[float] = None, latency_threshold: float = float('inf'),
+        relay: bool = False, turns: int = len(DEFAULT_SCRIPT), governor: LLMGovernor = llm_governor) -> LoadStats:
+    install_fake_router(latency, latency if fast_latency is None else fast_latency, jitter, latency_threshold, governor)
+    stats = LoadStats()
+    phones = itertools.cycle(CUSTOMER_DB.keys())
+    script = build_script(turns)
+
+    server = None
+    if relay:
+        main.VOICE_MODE = 'relay'
+        server, ws_url = start_local_server()
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(simulate_relay_call, ws_url, next(phones), script, stats, think_time)
+            if relay else
+            pool.submit(simulate_call, next(phones), script, stats, think_time)
+            for _ in range(calls)
+        ]
+        for future in futures:
+            future.result()
+
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if server:
+        server.shutdown()
+
+    report(stats, calls, elapsed, baseline, current, peak, governor)
+    return stats
+
+
+def stress(calls: int, requests_per_call: int, latency: float, jitter: float) -> bool:
+    """Fire overlapping /voice/process requests at each call and check that no turn is lost or interleaved.
+
+    Every other call is also hung up (a `completed` status) while its turns are still queued, to check
+    that ending a call cannot race with its own turns.
+    """
+    install_fake_router(latency, latency, jitter, float('inf'))
+    stats = LoadStats()
+    phones = itertools.cycle(CUSTOMER_DB.keys())
+    client = main.app.test_client()
+
+    call_sids = []
+    for _ in range(calls):
+        call_sid = f"CA{uuid.uuid4().hex}"
+        post(client, stats, '/voice/start', {'CallSid': call_sid, 'To': next(phones), 'From': main.TWILIO_PHONE_NUMBER})
+        main.call_state.active_calls[call_sid]['max_turns'] = requests_per_call + 1
+        call_sids.append(call_sid)
+    hung_up = call_sids[1::2]
+    failures = []
+
+    def turn(call_sid: str, i: int):
+        post(main.app.test_client(), stats, '/voice/process',
+             {'CallSid': call_sid, 'SpeechResult': f"When is my next payment due? ({i})"})
+
+    def turn_until_hangup(call_sid: str, i: int):
+        # The turn either runs normally or finds the call already ended and gets the hang-up reply
+        started = time.perf_counter()
+        resp = main.app.test_client().post('/voice/process', data={
+            'CallSid': call_sid, 'SpeechResult': f"When is my next payment due? ({i})"})
+        body = resp.get_data(as_text=True)
+        ended = "error with your call" in body
+        ok = resp.status_code == 200 and (ended or "error" not in body.lower())
+        stats.record('/voice/process (ended)' if ended else '/voice/process', time.perf_counter() - started, ok)
+
+    def hang_up(call_sid: str):
+        post(main.app.test_client(), stats, '/voice/status', {'CallSid': call_sid, 'To': '', 'CallStatus': 'completed'})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=calls * (requests_per_call + 1)) as pool:
+        futures = [pool.submit(turn, call_sid, i) for i in range(requests_per_call)
+                   for call_sid in call_sids if call_sid not in hung_up]
+        for call_sid in hung_up:
+            lock = main.call_state.active_calls[call_sid]['lock']
+            half = requests_per_call // 2
+            futures += [pool.submit(turn_until_hangup, call_sid, i) for i in range(half)]
+            deadline = time.perf_counter() + 5
+            while lock.waiting() == 0 and time.perf_counter() < deadline:
+                time.sleep(0.001)
+            if lock.waiting() == 0:
+                failures.append(f"{call_sid}: no turn was queued when the call was hung up")
+            futures.append(pool.submit(hang_up, call_sid))
+            futures += [pool.submit(turn_until_hangup, call_sid, i) for i in range(half, requests_per_call)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    for call_sid in call_sids:
+        if call_sid in hung_up:
+            continue
+        call_info = main.call_state.get_call_state(call_sid)
+        history = main.call_state.advisor_system.conversation_states[call_sid].conversation_history
+        roles = [msg.role for msg in history[1:]]
+        if call_info['turn_count'] != requests_per_call:
+            failures.append(f"{call_sid}: turn_count {call_info['turn_count']} != {requests_per_call}")
+        if len(history) != 1 + 2 * requests_per_call:
+            failures.append(f"{call_sid}: {len(history)} messages, expected {1 + 2 * requests_per_call}")
+        if roles != ['user', 'assistant'] * requests_per_call:
+            failures.append(f"{call_sid}: user and assistant messages are interleaved out of order")
+
+    for call_sid in call_sids:
+        if call_sid not in hung_up:
+            hang_up(call_sid)
+
+    errors = sum(stats.errors.values())
+    sessions_left = len(main.call_state.active_calls)
+    conversations_left = len(main.call_state.advisor_system.conversation_states)
+    usage_left = usage_tracker.get_totals()['active_calls']
+    if errors:
+        failures.append(f"{errors} requests failed")
+    if sessions_left or conversations_left or usage_left:
+        failures.append(f"state left behind: {sessions_left} sessions, {conversations_left} conversations, "
+                        f"{usage_left} calls in usage tracking")
+
+    # Turns of one call run one after another, but different calls must not wait on each other
+    turn_time = percentile(stats.latencies['/voice/process'], 1)
+    global_lock_time = turn_time * len(stats.latencies['/voice/process'])
+    if calls > 1 and elapsed >= global_lock_time / 2:
+        failures.append(f"took {elapsed:.2f}s, not well below the {global_lock_time:.2f}s a global lock would need")
+    print("\n🧪 Session stress test")
+    print(f"Calls: {calls} ({len(hung_up)} hung up mid-turn) | Overlapping requests per call: {requests_per_call} | "
+          f"Duration: {elapsed:.2f}s")
+    print(f"Fastest turn: {turn_time * 1000:.0f}ms -> one call's turns need >= {turn_time * requests_per_call:.2f}s; "
+          f"a single global lock would need >= {global_lock_time:.2f}s")
+    print(f"Turns answered after hang-up: {len(stats.latencies.get('/voice/process (ended)', []))}")
+    print(f"Errors: {errors} | Sessions left: {sessions_left} | Conversations left: {conversations_left}")
+    for failure in failures:
+        print(f"❌ {failure}")
+    print("✅ PASS: no lost or interleaved updates" if not failures else f"❌ FAIL: {len(failures)} problems")
+    return not failures
+
+
+def report(stats: LoadStats, calls: int, elapsed: float, baseline: int, current: int, peak: int,
+           governor: LLMGovernor = llm_governor):
+    total_requests = sum(len(v) for v in stats.latencies.values())
+    print("\n📈 Load test results")
+    print(f"Calls: {calls} | Requests: {total_requests} | Duration: {elapsed:.2f}s")
+    print(f"Throughput: {total_requests / elapsed:.1f} req/s, {calls / elapsed:.2f} calls/s")
+    print(f"\n{'Endpoint':<22}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>9}")
+    for endpoint, values in sorted(stats.latencies.items()):
+        errors = stats.errors.get(endpoint, 0)
+        print(
+            f"{endpoint:<22}{len(values):>8}"
+            f"{percentile(values, 50) * 1000:>10.1f}"
+            f"{percentile(values, 90) * 1000:>10.1f}"
+            f"{percentile(values, 99) * 1000:>10.1f}"
+            f"{max(values) * 1000:>10.1f}"
+            f"{errors:>6} ({errors / len(values):.1%})"
+        )
+
+    leftover_calls = len(main.call_state.active_calls)
+    leftover_conversations = len(main.call_state.advisor_system.conversation_states)
+    print("\n🧠 call_state memory")
+    print(f"Peak active calls: {stats.peak_active_calls} | Peak conversations: {stats.peak_conversations}")
+    print(f"Left after run: {leftover_calls} active calls, {leftover_conversations} conversations")
+    print(f"Traced memory: +{(current - baseline) / 1024:.1f} KiB retained, peak {peak / 1024 / 1024:.1f} MiB")
+
+    cache_stats = main.customer_cache.stats()
+    print(f"Customer cache: hit rate {cache_stats['hit_rate']:.1%}, "
+          f"{cache_stats['loads']} backend loads, {cache_stats['backend_calls_saved']} lookups served from cache")
+
+    summary_stats = agents.summarizer.stats()
+    print(f"Summaries: {summary_stats['runs']} runs, p95 {summary_stats['p95_latency'] * 1000:.1f}ms, "
+          f"{summary_stats['prompt_tokens_saved']} prompt tokens saved")
+
+    governor_stats = governor.stats()
+    print(f"\n🚦 LLM governor: {governor_stats['admitted']} requests, {governor_stats['queued']} queued, "
+          f"peak {governor_stats['peak_waiting']} waiting (max {governor_stats['max_concurrency']} in flight)")
+    print(f"{'Agent':<20}{'avg wait ms':>12}{'p95 wait ms':>12}{'avg model ms':>13}{'p95 model ms':>13}")
+    for agent, times in governor_stats['by_agent'].items():
+        print(f"{agent:<20}{times['avg_wait'] * 1000:>12.1f}{times['p95_wait'] * 1000:>12.1f}"
+              f"{times['avg_model_time'] * 1000:>13.1f}{times['p95_model_time'] * 1000:>13.1f}")
+
+    print("\n🔀 Model tiers")
+    for name, tier_stats in agents.model_router.stats().items():
+        print(f"{name:<10} degraded={tier_stats['degraded']} samples={tier_stats['samples']} "
+              f"avg={tier_stats['avg_latency'] * 1000:.1f}ms errors={tier_stats['error_rate']:.1%}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate concurrent Twilio calls against the Flask app")
+    parser.add_argument('--calls', type=int, default=200, help="Total number of simulated calls")
+    parser.add_argument('--concurrency', type=int, default=50, help="Calls in flight at once")
+    parser.add_argument('--latency', type=float, default=0.2, help="Mean fake LLM latency in seconds")
+    parser.add_argument('--fast-latency', type=float, default=None,
+                        help="Mean latency of the fast tier (defaults to --latency)")
+    parser.add_argument('--latency-threshold', type=float, default=float('inf'),
+                        help="p90 latency in seconds above which a tier is treated as degraded")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Std deviation of fake LLM latency")
+    parser.add_argument('--relay', action='store_true',
+                        help="Use the streaming ConversationRelay WebSocket mode instead of <Gather>")
+    parser.add_argument('--turns', type=int, default=len(DEFAULT_SCRIPT), help="Caller turns per call")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Max caller pause between turns in seconds")
+    parser.add_argument('--rpm', type=float, default=LLM_REQUESTS_PER_MINUTE, help="Governor requests per minute")
+    parser.add_argument('--tpm', type=float, default=LLM_TOKENS_PER_MINUTE, help="Governor tokens per minute")
+    parser.add_argument('--max-concurrency', type=int, default=LLM_MAX_CONCURRENCY,
+                        help="Governor limit on model requests in flight")
+    parser.add_argument('--stress', type=int, default=0, metavar='N',
+                        help="Instead of a load test, send N overlapping turns to each of --calls calls and "
+                             "check that none are lost")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.stress:
+        raise SystemExit(0 if stress(args.calls, args.stress, args.latency, args.jitter) else 1)
+    run(args.calls, args.concurrency, args.latency, args.jitter, args.think_time,
+        args.fast_latency, args.latency_threshold, args.relay, args.turns,
+        LLMGovernor(args.rpm, args.tpm, args.max_concurrency))
@@ -1,13 +1,24 @@
 import os
 from dotenv import load_dotenv
-from flask import Flask, request, Response
-from twilio.rest import Client
-from twilio.twiml.voice_response import VoiceResponse
+from flask import Flask, request, Response, jsonify
+from flask_sock import Sock
+from twilio.twiml.voice_response import VoiceResponse, Connect
+import hmac
+import json
+import functools
 import threading
 import time
-from typing import Optional, Dict
-from agents import LoanAdvisorSystem
+from contextlib import contextmanager
+from typing import Optional, Dict, Iterator
+from agents import LoanAdvisorSystem, summarizer
 from data import CUSTOMER_DB
+from cache import customer_cache
+from scheduler import CampaignScheduler
+from sessions import OrderedLock
+from usage import usage_tracker
+from governor import llm_governor
+from transport import transport
+from ingest import load_portfolio, apply_delta_lines
 
 load_dotenv()
 
@@ -15,9 +26,37 @@ TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID', 'your_account_sid_here')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', 'your_auth_token_here')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER', '+1234567890')  
 NGROK_URL = os.getenv('NGROK_URL', 'https://your-ngrok-url.ngrok.io')  
+# 'gather' answers each turn with <Say>; 'relay' streams sentences over a ConversationRelay WebSocket
+VOICE_MODE = os.getenv('VOICE_MODE', 'gather')
+# Seconds between campaign dials, and the longest the campaign dialer sleeps while waiting for retries
+CAMPAIGN_DIAL_INTERVAL = float(os.getenv('CAMPAIGN_DIAL_INTERVAL', '2'))
+CAMPAIGN_POLL_INTERVAL = float(os.getenv('CAMPAIGN_POLL_INTERVAL', '30'))
+# Optional full portfolio export (CSV or JSON lines) loaded at startup
+PORTFOLIO_PATH = os.getenv('PORTFOLIO_PATH')
+# Bearer token for the operator endpoints (usage, cache invalidation, portfolio deltas); they are disabled when unset
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN')
+
+GOODBYE_PHRASES = ['bye', 'goodbye', 'good bye', 'end call', 'hang up', 'thanks bye']
 
 app = Flask(__name__)
 
+def require_admin_token(view):
+    """Reject requests without `Authorization: Bearer <ADMIN_API_TOKEN>`.
+
+    The app shares its public tunnel with the Twilio webhooks, so anything that exposes
+    CallSids or changes customer data must not be reachable without the token.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_API_TOKEN:
+            return jsonify({'error': 'Endpoint disabled; set ADMIN_API_TOKEN to enable it'}), 403
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {ADMIN_API_TOKEN}'.encode()):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+sock = Sock(app)
+
 class CallState:
     def __init__(self):
         self.active_calls: Dict[str, dict] = {}
@@ -29,26 +68,39 @@ class CallState:
             'customer_phone': customer_phone,
             'conversation_started': False,
             'turn_count': 0,
-            'max_turns': 20
+            'max_turns': 20,
+            'lock': OrderedLock()
         }
     
     def get_call_state(self, call_sid: str):
         """Get call state by call SID"""
         return self.active_calls.get(call_sid)
+
+    @contextmanager
+    def session(self, call_sid: str) -> Iterator[Optional[dict]]:
+        """Serialize requests for one call in arrival order; other calls are not blocked"""
+        call_info = self.active_calls.get(call_sid)
+        if not call_info:
+            yield None
+            return
+        with call_info['lock']:
+            # The call may have ended while this request waited for its turn
+            yield call_info if self.active_calls.get(call_sid) is call_info else None
     
     def end_call(self, call_sid: str):
         """Clean up call state"""
-        if call_sid in self.active_calls:
-            customer_phone = self.active_calls[call_sid]['customer_phone']
-            self.advisor_system.end_conversation(customer_phone)
-            del self.active_calls[call_sid]
+        call_info = self.active_calls.pop(call_sid, None)
+        if call_info:
+            self.advisor_system.end_conversation(call_sid)
+            usage_tracker.finish_call(call_sid, call_info['customer_phone'])
 
 call_state = CallState()
+campaign_scheduler = CampaignScheduler()
 
 def make_outbound_call(customer_phone: str) -> bool:
     """Make an outbound call to a customer"""
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        client = transport.twilio_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
         call = client.calls.create(
             to=customer_phone,
@@ -81,9 +133,20 @@ def voice_start():
     call_state.start_call(call_sid, to_number)
 
     try:
-        initial_message = call_state.advisor_system.start_conversation(to_number)
-        call_state.active_calls[call_sid]['conversation_started'] = True
-        
+        with call_state.session(call_sid) as call_info:
+            initial_message = call_state.advisor_system.start_conversation(call_sid, to_number)
+            call_info['conversation_started'] = True
+
+        if VOICE_MODE == 'relay':
+            connect = Connect()
+            connect.conversation_relay(
+                url=f"{NGROK_URL.replace('https://', 'wss://', 1)}/voice/relay",
+                welcome_greeting=initial_message,
+                interruptible=True
+            )
+            response.append(connect)
+            return Response(str(response), mimetype='text/xml')
+
         response.say(initial_message, voice='alice', language='en-US')
 
         gather = response.gather(
@@ -107,21 +170,24 @@ def voice_start():
 @app.route('/voice/process', methods=['POST'])
 def voice_process():
     """Process user speech input and generate AI response"""
-    response = VoiceResponse()
-    
     call_sid = request.form.get('CallSid')
     speech_result = request.form.get('SpeechResult', '').strip()
     
     print(f"🎤 User said: '{speech_result}' (Call: {call_sid})")
-    
-    call_info = call_state.get_call_state(call_sid)
+
+    with call_state.session(call_sid) as call_info:
+        return process_speech(call_sid, call_info, speech_result)
+
+def process_speech(call_sid: str, call_info: Optional[dict], speech_result: str) -> Response:
+    """Run one conversational turn; the caller holds the call's session lock"""
+    response = VoiceResponse()
+
     if not call_info:
         response.say("I'm sorry, there was an error with your call.")
         response.hangup()
         return Response(str(response), mimetype='text/xml')
 
-    goodbye_phrases = ['bye', 'goodbye', 'good bye', 'end call', 'hang up', 'thanks bye']
-    if any(phrase in speech_result.lower() for phrase in goodbye_phrases):
+    if any(phrase in speech_result.lower() for phrase in GOODBYE_PHRASES):
         response.say("Thank you for your time. Goodbye!", voice='alice')
         response.hangup()
         call_state.end_call(call_sid)
@@ -146,14 +212,14 @@ def voice_process():
         return Response(str(response), mimetype='text/xml')
     
     try:
-        customer_phone = call_info['customer_phone']
-        ai_response = call_state.advisor_system.continue_conversation(customer_phone, speech_result)
+        with usage_tracker.call(call_sid):
+            ai_response = call_state.advisor_system.continue_conversation(call_sid, speech_result)
         
         print(f"🤖 AI Response: {ai_response}")
 
         response.say(ai_response, voice='alice', language='en-US')
         
-        state = call_state.advisor_system.conversation_states.get(customer_phone)
+        state = call_state.advisor_system.conversation_states.get(call_sid)
         if state and (state.conversation_complete or state.escalation_needed):
             response.say("Thank you for your time. Have a great day!", voice='alice')
             response.hangup()
@@ -184,6 +250,76 @@ def voice_process():
     
     return Response(str(response), mimetype='text/xml')
 
+def relay_send(ws, text: str, last: bool):
+    """Send a piece of text to ConversationRelay for speech"""
+    ws.send(json.dumps({'type': 'text', 'token': text, 'last': last}))
+
+def relay_hangup(ws, call_sid: str, message: str):
+    """Speak a closing message and end the relay session"""
+    relay_send(ws, message, last=True)
+    ws.send(json.dumps({'type': 'end'}))
+    call_state.end_call(call_sid)
+
+@sock.route('/voice/relay')
+def voice_relay(ws):
+    """Real-time mode: stream the orchestrator's reply sentence by sentence over ConversationRelay"""
+    call_sid = None
+
+    while True:
+        raw = ws.receive()
+        if raw is None:
+            break
+        message = json.loads(raw)
+        message_type = message.get('type')
+
+        if message_type == 'setup':
+            call_sid = message.get('callSid')
+            print(f"🔌 Relay session connected - SID: {call_sid}")
+            continue
+
+        if message_type != 'prompt':
+            # interrupt, dtmf and error messages need no reply
+            continue
+
+        speech_result = message.get('voicePrompt', '').strip()
+        print(f"🎤 User said: '{speech_result}' (Call: {call_sid})")
+
+        with call_state.session(call_sid) as call_info:
+            keep_open = relay_prompt(ws, call_sid, call_info, speech_result)
+        if not keep_open:
+            break
+
+def relay_prompt(ws, call_sid: str, call_info: Optional[dict], speech_result: str) -> bool:
+    """Stream one turn over the relay; returns False once the session has ended"""
+    if not call_info:
+        relay_send(ws, "I'm sorry, there was an error with your call.", last=True)
+        ws.send(json.dumps({'type': 'end'}))
+        return False
+
+    if any(phrase in speech_result.lower() for phrase in GOODBYE_PHRASES):
+        relay_hangup(ws, call_sid, "Thank you for your time. Goodbye!")
+        return False
+
+    call_info['turn_count'] += 1
+    if call_info['turn_count'] >= call_info['max_turns']:
+        relay_hangup(ws, call_sid, "We've reached the maximum conversation time. Thank you for your time. Goodbye!")
+        return False
+
+    if not speech_result:
+        relay_send(ws, "I didn't catch that. Could you please repeat?", last=True)
+        return True
+
+    with usage_tracker.call(call_sid):
+        for sentence in call_state.advisor_system.stream_conversation(call_sid, speech_result):
+            relay_send(ws, sentence + ' ', last=False)
+    relay_send(ws, '', last=True)
+
+    state = call_state.advisor_system.conversation_states.get(call_sid)
+    if state and (state.conversation_complete or state.escalation_needed):
+        relay_hangup(ws, call_sid, "Thank you for your time. Have a great day!")
+        return False
+    return True
+
 @app.route('/voice/status', methods=['POST'])
 def voice_status():
     """Handle call status updates"""
@@ -193,33 +329,125 @@ def voice_status():
     print(f"📊 Call Status Update - SID: {call_sid}, Status: {call_status}")
     
     if call_status in ['completed', 'busy', 'no-answer', 'failed', 'canceled']:
-        call_state.end_call(call_sid)
+        # Wait for any turn still running on this call before tearing it down
+        with call_state.session(call_sid):
+            call_state.end_call(call_sid)
+        # Finish or reschedule the customer if this call was placed by a campaign
+        campaign_scheduler.record_outcome(request.form.get('To'), call_status)
         print(f"🔚 Call {call_sid} ended with status: {call_status}")
     
     return Response('OK', mimetype='text/plain')
 
+@app.route('/usage', methods=['GET'])
+@require_admin_token
+def usage_totals():
+    """Model usage aggregated across all calls since startup"""
+    return jsonify(usage_tracker.get_totals())
+
+@app.route('/usage/<call_sid>', methods=['GET'])
+@require_admin_token
+def usage_for_call(call_sid: str):
+    """Model usage for a live call"""
+    usage = usage_tracker.get_call_usage(call_sid)
+    if usage is None:
+        return jsonify({'error': f'No usage recorded for call {call_sid}'}), 404
+    return jsonify(usage)
+
+@app.route('/transport/stats', methods=['GET'])
+def transport_stats():
+    """Connection pool statistics for the LLM and Twilio clients"""
+    return jsonify(transport.stats())
+
+@app.route('/governor/stats', methods=['GET'])
+def governor_stats():
+    """Model request queue: wait time and model time per agent, rate-limit headroom"""
+    return jsonify(llm_governor.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Customer cache hit/miss statistics"""
+    return jsonify(customer_cache.stats())
+
+@app.route('/cache/invalidate', methods=['POST'])
+@require_admin_token
+def cache_invalidate():
+    """Invalidation hook for the loan-servicing backend when a customer's balance changes"""
+    phone = request.form.get('phone') or (request.get_json(silent=True) or {}).get('phone')
+    if not phone:
+        return jsonify({'error': 'phone is required'}), 400
+    customer_cache.invalidate(phone)
+    return jsonify({'invalidated': phone})
+
+@app.route('/summarizer/stats', methods=['GET'])
+def summarizer_stats():
+    """Rolling conversation summary latency and prompt tokens saved"""
+    return jsonify(summarizer.stats())
+
+@app.route('/portfolio/deltas', methods=['POST'])
+@require_admin_token
+def portfolio_deltas():
+    """Apply intraday JSON-lines deltas (payments, due-date changes) to the loaded portfolio"""
+    lines = (line.decode('utf-8') for line in request.stream)
+    try:
+        counts = apply_delta_lines(lines)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid delta, nothing was applied: {str(e)}'}), 400
+    print(f"🔁 Portfolio deltas applied: {counts}")
+    return jsonify(counts)
+
+@app.route('/campaign/stats', methods=['GET'])
+def campaign_stats():
+    """Campaign queue size and retry counters"""
+    return jsonify(campaign_scheduler.stats())
+
+def run_campaign():
+    """Dial customers in priority order until the campaign queue is empty"""
+    queued = campaign_scheduler.enqueue_customers(list(CUSTOMER_DB.values()))
+    print(f"📋 {queued} customers queued, most overdue first. Press Ctrl+C to pause.")
+
+    try:
+        while True:
+            customer_phone = campaign_scheduler.dequeue()
+            if customer_phone is None:
+                wait = campaign_scheduler.next_ready_in()
+                if wait is None and campaign_scheduler.stats()['dialing'] == 0:
+                    print("✅ Campaign complete, no customers left to call.")
+                    return
+                time.sleep(min(wait if wait is not None else CAMPAIGN_POLL_INTERVAL, CAMPAIGN_POLL_INTERVAL))
+                continue
+
+            if not make_outbound_call(customer_phone):
+                campaign_scheduler.record_outcome(customer_phone, 'failed')
+            time.sleep(CAMPAIGN_DIAL_INTERVAL)
+    except KeyboardInterrupt:
+        print("\n⏸️ Campaign paused. Pending customers stay queued for next time.")
+
 def get_customer_phone() -> Optional[str]:
     """Get customer phone number from user input."""
     while True:
         print("\nOptions:")
         print("1. Make an outbound call to a customer")
+        print("2. Run a collection campaign")
         print("9. Exit")
         
-        choice = input("\nSelect an option (1 or 9): ").strip()
+        choice = input("\nSelect an option (1, 2 or 9): ").strip()
         
         if choice == "1":
             phone = input("Enter customer phone number (e.g., +1234567890): ").strip()
-            if phone in CUSTOMER_DB:
+            if customer_cache.get(phone):
                 return phone
             else:
                 print(f"❌ Customer not found for phone number: {phone}")
+
+        elif choice == "2":
+            run_campaign()
             
         elif choice == "9":
             print("👋 Goodbye!")
             return None
             
         else:
-            print("❌ Invalid option. Please select 1 or 9.")
+            print("❌ Invalid option. Please select 1, 2 or 9.")
 
 def start_flask_server():
     """Start the Flask server in a separate thread"""
@@ -240,6 +468,11 @@ def main():
         print("Please configure your ngrok URL in the NGROK_URL variable.")
         return
     
+    if PORTFOLIO_PATH:
+        started = time.perf_counter()
+        loaded = load_portfolio(PORTFOLIO_PATH)
+        print(f"📥 Loaded {loaded} customers from {PORTFOLIO_PATH} in {time.perf_counter() - started:.1f}s")
+
     try:
         print("Starting webhook server...")
         flask_thread = threading.Thread(target=start_flask_server, daemon=True)
@@ -258,7 +491,7 @@ def main():
                 break
             
             try:
-                customer = CUSTOMER_DB[customer_phone]
+                customer = customer_cache.get(customer_phone)
                 print(f"\n📞 Initiating outbound call to {customer.full_name} ({customer_phone})")
                 
                 if make_outbound_call(customer_phone):
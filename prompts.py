@@ -37,9 +37,12 @@ IMPORTANT RULES:
 - Only escalate when needed
 - End calls gracefully when tasks are complete
 - Use conversation history to maintain context and flow
+- If the conversation state has a verification_note, verification was already done for this turn: follow the note and do not call the verification agent
+- If the conversation state has a spoken_date, it is the date the customer just said (YYYY-MM-DD)
 
 Current conversation state: {conversation_state}
 Customer phone: {customer_phone}
+Summary of earlier conversation: {context_summary}
 Conversation history: {conversation_history}
 
 Based on the conversation history and current state, respond appropriately to continue the conversation flow."""),
@@ -154,4 +157,19 @@ Always provide customers with:
 Customer phone: {customer_phone}"""),
     ("human", "{input}"),
     ("placeholder", "{agent_scratchpad}")
-])
\ No newline at end of file
+])
+
+# Conversation Summarizer Prompt
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You maintain a running summary of a phone call between a loan advisor AI and a customer.
+
+Update the existing summary with the new messages. Rules:
+- Keep every concrete fact: amounts, dates, payment methods, payment link or plan IDs, ticket IDs
+- Keep what the customer agreed to, promised, refused or disputed
+- Keep the verification outcome and any escalation
+- Drop greetings, small talk and repeated information
+- Write at most 6 short sentences in plain text
+
+Existing summary: {summary}"""),
+    ("human", "New messages:\n{messages}")
+])
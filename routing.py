@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from governor import LLMGovernor, llm_governor
+from transport import transport
+
+PRIMARY_MODEL = os.getenv('PRIMARY_MODEL', 'gpt-4o-mini')
+FAST_MODEL = os.getenv('FAST_MODEL', 'gpt-4.1-nano')
+PRIMARY_LATENCY_THRESHOLD = float(os.getenv('PRIMARY_LATENCY_THRESHOLD', '6.0'))
+FAST_LATENCY_THRESHOLD = float(os.getenv('FAST_LATENCY_THRESHOLD', '3.0'))
+
+# Preferred tiers for each agent, in fallback order
+AGENT_MODEL_ROUTES = {
+    "orchestrator": ["primary", "fast"],
+    "verification": ["primary", "fast"],
+    "emi_reminder": ["fast", "primary"],
+    "payment_collection": ["fast", "primary"],
+    "payment_plan": ["primary", "fast"],
+    "escalation": ["fast", "primary"],
+    "summarizer": ["fast", "primary"],
+}
+
+
+class ModelTier:
+    """A chat model plus a rolling window of its recent latencies and failures."""
+
+    def __init__(self, name: str, model: BaseChatModel, latency_threshold: float,
+                 window_size: int = 50, min_samples: int = 5, max_error_rate: float = 0.2,
+                 cooldown: float = 30.0, governor: Optional[LLMGovernor] = llm_governor):
+        self.name = name
+        self.model = model
+        self.latency_threshold = latency_threshold
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=window_size)
+        self._failures: deque = deque(maxlen=window_size)
+        self._degraded_until = 0.0
+
+        # Time every request the model serves, whichever agent issued it. The governor goes first
+        # so that time spent queuing for a slot is not counted against the tier.
+        handlers = [governor] if governor else []
+        self.model.callbacks = handlers + list(self.model.callbacks or []) + [TierLatencyHandler(self)]
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self._latencies.append(latency)
+            self._failures.append(not ok)
+            if len(self._latencies) >= self.min_samples and self._window_unhealthy():
+                self._degraded_until = time.monotonic() + self.cooldown
+                self._latencies.clear()
+                self._failures.clear()
+                print(f"⚠️ Model tier '{self.name}' degraded, routing around it for {self.cooldown:.0f}s")
+
+    def _window_unhealthy(self) -> bool:
+        ordered = sorted(self._latencies)
+        p90 = ordered[int(0.9 * (len(ordered) - 1))]
+        error_rate = sum(self._failures) / len(self._failures)
+        return p90 > self.latency_threshold or error_rate > self.max_error_rate
+
+    def is_degraded(self) -> bool:
+        # After the cooldown the tier is tried again with a fresh window
+        return time.monotonic() < self._degraded_until
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            latencies = list(self._latencies)
+            failures = list(self._failures)
+        return {
+            "degraded": self.is_degraded(),
+            "samples": len(latencies),
+            "avg_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+            "error_rate": sum(failures) / len(failures) if failures else 0.0,
+            "latency_threshold": self.latency_threshold,
+        }
+
+
+class TierLatencyHandler(BaseCallbackHandler):
+    """Feeds the wall-clock time of each model request back into its tier."""
+
+    def __init__(self, tier: ModelTier):
+        self.tier = tier
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.monotonic()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.tier.record(time.monotonic() - started, ok=True)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.tier.record(time.monotonic() - started, ok=False)
+
+
+class ModelRouter:
+    """Chooses a chat model for each agent, failing over to backup tiers when one degrades."""
+
+    def __init__(self, tiers: List[ModelTier], routes: Optional[Dict[str, List[str]]] = None,
+                 default_route: Optional[List[str]] = None):
+        self.tiers = {tier.name: tier for tier in tiers}
+        self.routes = routes or AGENT_MODEL_ROUTES
+        self.default_route = default_route or [tiers[0].name]
+
+    def tier_for(self, agent: str) -> ModelTier:
+        route = [self.tiers[name] for name in self.routes.get(agent, self.default_route)]
+        for tier in route:
+            if not tier.is_degraded():
+                return tier
+        # Every tier is degraded; stay on the preferred one rather than refusing the call
+        return route[0]
+
+    def model_for(self, agent: str) -> BaseChatModel:
+        return self.tier_for(agent).model
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {name: tier.stats() for name, tier in self.tiers.items()}
+
+
+def create_default_router(api_key: Optional[str]) -> ModelRouter:
+    """Router with a primary tier and a faster, cheaper tier for simple agents."""
+    # Both tiers talk to the same host, so they share one keep-alive connection pool
+    http_client = transport.llm_http_client()
+    return ModelRouter([
+        ModelTier("primary",
+                  ChatOpenAI(model=PRIMARY_MODEL, api_key=api_key, temperature=0.1, stream_usage=True,
+                             http_client=http_client),
+                  latency_threshold=PRIMARY_LATENCY_THRESHOLD),
+        ModelTier("fast",
+                  ChatOpenAI(model=FAST_MODEL, api_key=api_key, temperature=0.1, stream_usage=True,
+                             http_client=http_client),
+                  latency_threshold=FAST_LATENCY_THRESHOLD),
+    ])
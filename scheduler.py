@@ -0,0 +1,341 @@
+import heapq
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from data import Customer
+
+CAMPAIGN_DB_PATH = os.getenv('CAMPAIGN_DB_PATH', 'campaign.db')
+MAX_CALL_ATTEMPTS = int(os.getenv('MAX_CALL_ATTEMPTS', '5'))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '900'))  # seconds
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '86400'))  # seconds
+# Default calling window for customers without their own, in each customer's local hours
+CALL_WINDOW_START = int(os.getenv('CALL_WINDOW_START', '9'))
+CALL_WINDOW_END = int(os.getenv('CALL_WINDOW_END', '20'))  # exclusive
+
+RETRYABLE_STATUSES = {'busy', 'no-answer', 'failed', 'canceled'}
+
+
+@dataclass
+class CampaignEntry:
+    phone: str
+    days_overdue: int
+    next_emi_amount: float
+    late_fee: float
+    not_before: float = 0.0
+    attempts: int = 0
+    window_start: int = CALL_WINDOW_START
+    window_end: int = CALL_WINDOW_END
+    timezone: str = ""  # IANA name the window hours are in; empty means server-local
+    fingerprint: str = ""  # record_fingerprint() of the customer when last queued
+    version: int = 0
+
+    @property
+    def priority(self) -> tuple:
+        # Most overdue first, then largest EMI, then largest late fee
+        return (-self.days_overdue, -self.next_emi_amount, -self.late_fee)
+
+    @property
+    def window(self) -> tuple:
+        return (self.window_start, self.window_end, self.timezone)
+
+
+def days_overdue(customer: Customer, now: Optional[datetime] = None) -> int:
+    """Days past the customer's next due date (0 if not yet due)."""
+    due_date = datetime.strptime(customer.next_due_date, "%Y-%m-%d")
+    current_date = now or datetime.now()
+    return max(0, (current_date - due_date).days)
+
+
+def record_fingerprint(customer: Customer) -> str:
+    """The parts of a customer record that, when they change, make a finished customer worth calling again."""
+    return f"{customer.next_due_date}|{customer.next_emi_amount}|{customer.current_balance}|{customer.late_fee}"
+
+
+@lru_cache(maxsize=None)
+def _zone(timezone: str) -> Optional[ZoneInfo]:
+    if not timezone:
+        return None
+    try:
+        return ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"⚠️ Unknown timezone '{timezone}', using server-local time for its calling window")
+        return None
+
+
+def next_window_open(timestamp: float, window_start: int, window_end: int, timezone: str = "") -> float:
+    """Earliest time at or after `timestamp` that falls inside the daily calling window.
+
+    The window hours are wall-clock hours in `timezone` (server-local when empty).
+    """
+    moment = datetime.fromtimestamp(timestamp, _zone(timezone))
+    if window_start <= moment.hour < window_end:
+        return timestamp
+    opening = moment.replace(hour=window_start, minute=0, second=0, microsecond=0)
+    if moment.hour >= window_end:
+        opening += timedelta(days=1)
+    return opening.timestamp()
+
+
+class CampaignScheduler:
+    """Persistent dialing queue ordered by collection priority, with retry backoff and calling windows.
+
+    Entries that may be dialed now sit in priority heaps, one per calling window, so a closed window
+    is skipped without touching its entries. Entries waiting for a retry delay sit in a heap ordered
+    by time. Dequeue and re-enqueue are O(log n) per distinct window. Every change is written through
+    to SQLite and the heaps are rebuilt from it on startup.
+
+    Customers whose call completed or who ran out of attempts are recorded as finished, and later
+    campaigns skip them until their record changes (see record_fingerprint).
+    """
+
+    def __init__(self, db_path: str = CAMPAIGN_DB_PATH, max_attempts: int = MAX_CALL_ATTEMPTS,
+                 base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._entries: Dict[str, CampaignEntry] = {}
+        self._ready: Dict[tuple, List[tuple]] = {}
+        self._delayed: List[tuple] = []
+        self._dialing: set = set()
+        self._finished: Dict[str, str] = {}  # phone -> fingerprint of the record it finished with
+        self._stats = {'dequeued': 0, 'retries': 0, 'completed': 0, 'exhausted': 0}
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS campaign_entries (
+                phone TEXT PRIMARY KEY,
+                days_overdue INTEGER NOT NULL,
+                next_emi_amount REAL NOT NULL,
+                late_fee REAL NOT NULL,
+                not_before REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                window_start INTEGER NOT NULL,
+                window_end INTEGER NOT NULL,
+                timezone TEXT NOT NULL DEFAULT '',
+                fingerprint TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS campaign_finished (
+                phone TEXT PRIMARY KEY,
+                outcome TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                finished_at REAL NOT NULL
+            )
+        """)
+        # Queues written by older versions lack the newer columns; their entries get the defaults
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(campaign_entries)")}
+        for column in ('timezone', 'fingerprint'):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE campaign_entries ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+        self._db.commit()
+        self._restore()
+
+    def _restore(self):
+        """Rebuild both heaps from the database (O(n) heapify)."""
+        rows = self._db.execute(
+            "SELECT phone, days_overdue, next_emi_amount, late_fee, not_before, attempts, window_start, window_end, "
+            "timezone, fingerprint FROM campaign_entries"
+        )
+        now = time.time()
+        for row in rows:
+            # Calls that were being dialed when the process stopped are simply tried again
+            entry = CampaignEntry(*row)
+            self._entries[entry.phone] = entry
+            if entry.not_before <= now:
+                self._ready_heap(entry).append((entry.priority, entry.phone, entry.version))
+            else:
+                self._delayed.append((entry.not_before, entry.phone, entry.version))
+        for heap in self._ready.values():
+            heapq.heapify(heap)
+        heapq.heapify(self._delayed)
+        self._finished = dict(self._db.execute("SELECT phone, fingerprint FROM campaign_finished"))
+
+    def _ready_heap(self, entry: CampaignEntry) -> List[tuple]:
+        return self._ready.setdefault(entry.window, [])
+
+    def _persist(self, entries: Iterable[CampaignEntry]):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO campaign_entries "
+            "(phone, days_overdue, next_emi_amount, late_fee, not_before, attempts, window_start, window_end, "
+            "timezone, fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(e.phone, e.days_overdue, e.next_emi_amount, e.late_fee, e.not_before, e.attempts,
+              e.window_start, e.window_end, e.timezone, e.fingerprint) for e in entries]
+        )
+        self._db.commit()
+
+    def _finish(self, entry: CampaignEntry, outcome: str):
+        """Take a customer out of the queue for good, until their record changes."""
+        self._entries.pop(entry.phone, None)
+        self._dialing.discard(entry.phone)
+        self._finished[entry.phone] = entry.fingerprint
+        self._db.execute("DELETE FROM campaign_entries WHERE phone = ?", (entry.phone,))
+        self._db.execute(
+            "INSERT OR REPLACE INTO campaign_finished (phone, outcome, fingerprint, finished_at) VALUES (?, ?, ?, ?)",
+            (entry.phone, outcome, entry.fingerprint, time.time())
+        )
+        self._db.commit()
+
+    def _push(self, entry: CampaignEntry, now: float):
+        # Bumping the version invalidates any copy of this entry still sitting in a heap
+        entry.version += 1
+        self._dialing.discard(entry.phone)
+        if entry.not_before <= now:
+            heapq.heappush(self._ready_heap(entry), (entry.priority, entry.phone, entry.version))
+        else:
+            heapq.heappush(self._delayed, (entry.not_before, entry.phone, entry.version))
+
+    def enqueue_customers(self, customers: Iterable[Customer], window_start: int = CALL_WINDOW_START,
+                          window_end: int = CALL_WINDOW_END) -> int:
+        """Add or refresh customers in the campaign; their priority comes from the current record.
+
+        A customer's own calling window and timezone, when set, replace the stored ones. Otherwise an
+        existing entry keeps its window (e.g. one set with set_calling_window) and a new entry gets
+        `window_start`/`window_end` in server-local time. Finished customers are skipped unless their
+        record changed since, in which case they start again with no attempts.
+        """
+        now = time.time()
+        changed = []
+        reopened = []
+        with self._lock:
+            for customer in customers:
+                fingerprint = record_fingerprint(customer)
+                if customer.phone in self._finished:
+                    if self._finished[customer.phone] == fingerprint:
+                        continue
+                    del self._finished[customer.phone]
+                    reopened.append((customer.phone,))
+                entry = self._entries.get(customer.phone)
+                if entry is None:
+                    entry = CampaignEntry(customer.phone, 0, 0.0, 0.0, not_before=now,
+                                          window_start=window_start, window_end=window_end)
+                    self._entries[customer.phone] = entry
+                entry.days_overdue = days_overdue(customer)
+                entry.next_emi_amount = customer.next_emi_amount
+                entry.late_fee = customer.late_fee
+                entry.fingerprint = fingerprint
+                if customer.call_window_start is not None:
+                    entry.window_start = customer.call_window_start
+                if customer.call_window_end is not None:
+                    entry.window_end = customer.call_window_end
+                if customer.timezone:
+                    entry.timezone = customer.timezone
+                if customer.phone not in self._dialing:
+                    self._push(entry, now)
+                changed.append(entry)
+            self._db.executemany("DELETE FROM campaign_finished WHERE phone = ?", reopened)
+            self._persist(changed)
+        return len(changed)
+
+    def set_calling_window(self, phone: str, window_start: int, window_end: int, timezone: Optional[str] = None):
+        """Restrict when a customer may be called (hours in `timezone`, or the stored one; end exclusive)."""
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None:
+                return
+            entry.window_start = window_start
+            entry.window_end = window_end
+            if timezone is not None:
+                entry.timezone = timezone
+            if phone not in self._dialing:
+                # Move it to its new window's heap; the copy in the old one is now stale
+                self._push(entry, time.time())
+            self._persist([entry])
+
+    def _open_heads(self, now: float) -> List[List[tuple]]:
+        """Ready heaps whose calling window is open now, with stale entries dropped from their heads."""
+        heads = []
+        for window, heap in list(self._ready.items()):
+            while heap:
+                _, phone, version = heap[0]
+                entry = self._entries.get(phone)
+                if entry and entry.version == version:
+                    break
+                heapq.heappop(heap)
+            if not heap:
+                del self._ready[window]
+            elif next_window_open(now, *window) <= now:
+                heads.append(heap)
+        return heads
+
+    def dequeue(self, now: Optional[float] = None) -> Optional[str]:
+        """Return the highest-priority phone that may be dialed now, or None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._delayed and self._delayed[0][0] <= now:
+                _, phone, version = heapq.heappop(self._delayed)
+                entry = self._entries.get(phone)
+                if entry and entry.version == version:
+                    heapq.heappush(self._ready_heap(entry), (entry.priority, phone, version))
+
+            # Entries in a closed window stay where they are until it opens
+            heads = self._open_heads(now)
+            if not heads:
+                return None
+            _, phone, _ = heapq.heappop(min(heads, key=lambda heap: heap[0]))
+            self._dialing.add(phone)
+            self._stats['dequeued'] += 1
+            return phone
+
+    def next_ready_in(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until an entry may be dialed (0 if one can be dialed now), or None if the queue is empty."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._open_heads(now):
+                return 0.0
+            # Retries become ready at their time; ready entries when their window opens
+            candidates = [next_window_open(now, *window) for window in self._ready]
+            if self._delayed:
+                candidates.append(self._delayed[0][0])
+        return max(0.0, min(candidates) - now) if candidates else None
+
+    def record_outcome(self, phone: str, call_status: str):
+        """Feed a Twilio call status back into the campaign: finish, retry with backoff or give up."""
+        with self._lock:
+            entry = self._entries.get(phone)
+            # Manual calls and other traffic to a queued customer must not change campaign state
+            if entry is None or phone not in self._dialing:
+                return
+
+            if call_status == 'completed':
+                self._finish(entry, 'completed')
+                self._stats['completed'] += 1
+                return
+
+            if call_status not in RETRYABLE_STATUSES:
+                return
+
+            entry.attempts += 1
+            if entry.attempts >= self.max_attempts:
+                self._finish(entry, 'exhausted')
+                self._stats['exhausted'] += 1
+                print(f"🚫 Giving up on {phone} after {entry.attempts} attempts")
+                return
+
+            # Exponential backoff with jitter so retries of one busy hour do not all land together
+            delay = min(self.max_delay, self.base_delay * (2 ** (entry.attempts - 1)))
+            now = time.time()
+            entry.not_before = now + delay * random.uniform(0.8, 1.2)
+            self._push(entry, now)
+            self._persist([entry])
+            self._stats['retries'] += 1
+            print(f"🔁 Call to {phone} ended '{call_status}', retry {entry.attempts} in {delay / 60:.0f} min")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._entries)
+            stats['dialing'] = len(self._dialing)
+            stats['finished'] = len(self._finished)
+        return stats
@@ -0,0 +1,39 @@
+import threading
+
+
+class OrderedLock:
+    """FIFO lock: threads get the lock in the order they asked for it.
+
+    A plain threading.Lock makes no ordering promise, so two webhooks for the same call
+    could be handled out of order. Each call gets its own OrderedLock, so different calls
+    never wait on each other.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._next_ticket = 0
+        self._now_serving = 0
+
+    def acquire(self):
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._now_serving:
+                self._cond.wait()
+
+    def release(self):
+        with self._cond:
+            self._now_serving += 1
+            self._cond.notify_all()
+
+    def waiting(self) -> int:
+        """Requests queued behind the current holder."""
+        with self._cond:
+            return max(0, self._next_ticket - self._now_serving - 1)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
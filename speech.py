@@ -0,0 +1,387 @@
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+SPEECH_CONFIDENCE_THRESHOLD = float(os.getenv('SPEECH_CONFIDENCE_THRESHOLD', '0.8'))
+
+UNITS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4,
+    'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9,
+}
+# Words speech recognition often returns for digits; only trusted next to real digits
+HOMOPHONES = {
+    'oh': 0, 'o': 0, 'won': 1, 'to': 2, 'too': 2,
+    'tree': 3, 'for': 4, 'fore': 4, 'ate': 8,
+}
+TEENS = {
+    'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13, 'fourteen': 14,
+    'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19,
+}
+TENS = {
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50,
+    'sixty': 60, 'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+REPEATS = {'double': 2, 'triple': 3}
+ORDINALS = {
+    'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5, 'sixth': 6, 'seventh': 7,
+    'eighth': 8, 'ninth': 9, 'tenth': 10, 'eleventh': 11, 'twelfth': 12, 'thirteenth': 13,
+    'fourteenth': 14, 'fifteenth': 15, 'sixteenth': 16, 'seventeenth': 17, 'eighteenth': 18,
+    'nineteenth': 19, 'twentieth': 20, 'thirtieth': 30,
+}
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'jun': 6, 'jul': 7, 'aug': 8,
+    'sep': 9, 'sept': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+YES_PHRASES = [
+    ('yes',), ('yeah',), ('yep',), ('yup',), ('ya',), ('correct',), ("that's", 'right'), ('that', 'is', 'right'),
+    ('speaking',), ('sure',), ('absolutely',), ('affirmative',), ('indeed',), ('of', 'course'),
+    ("that's", 'me'), ("it's", 'me'), ('this', 'is', 'he'), ('this', 'is', 'she'),
+]
+NO_PHRASES = [
+    ('no',), ('nope',), ('nah',), ('negative',), ('incorrect',), ('wrong', 'number'), ('wrong', 'person'),
+    ('not', 'me'), ("that's", 'not', 'me'), ("that's", 'not', 'right'), ('that', 'is', 'not', 'right'),
+    ('not', 'correct'), ("isn't", 'correct'), ("isn't", 'right'),
+]
+# Answers that are neither a yes nor a no to "are we speaking with ...?"; the orchestrator handles them
+AMBIGUOUS_PHRASES = [
+    ('not', 'sure'), ("don't", 'know'), ('no', 'idea'), ('unsure',), ('maybe',), ('perhaps',),
+    ('i', 'think'), ('i', 'guess'), ('no', 'problem'), ('no', 'worries'), ('not', 'now'), ('not', 'right', 'now'),
+]
+# Words that do not change the meaning of a short yes/no answer
+FILLER = {
+    'um', 'uh', 'hmm', 'hi', 'hello', 'well', 'oh', 'ok', 'okay', 'so', 'this', 'is', 'it', 'that',
+    "that's", "it's", 'i', 'am', 'me', 'the', 'a', 'yes', 'sir', "ma'am", 'madam', 'please', 'thanks',
+    'thank', 'you', 'speaking', 'he', 'she',
+}
+
+TOKEN_PATTERN = re.compile(r"\d+(?:st|nd|rd|th)?|[a-z]+(?:'[a-z]+)?")
+
+
+@dataclass
+class SpeechExtraction:
+    value: Optional[object]
+    confidence: float = 0.0
+
+    @property
+    def confident(self) -> bool:
+        return self.value is not None and self.confidence >= SPEECH_CONFIDENCE_THRESHOLD
+
+
+NOTHING = SpeechExtraction(None, 0.0)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case words and digit runs; hyphens split ("twenty-one" -> "twenty", "one")."""
+    return TOKEN_PATTERN.findall(text.lower().replace('-', ' '))
+
+
+def _small_number(tokens: List[str], i: int) -> Tuple[Optional[int], int]:
+    """Read a number below 100 spoken as words at tokens[i]; returns (value, tokens used)."""
+    token = tokens[i] if i < len(tokens) else None
+    if token in TEENS:
+        return TEENS[token], 1
+    if token in TENS:
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+        if following in UNITS and UNITS[following]:
+            return TENS[token] + UNITS[following], 2
+        return TENS[token], 1
+    if token in UNITS:
+        return UNITS[token], 1
+    return None, 0
+
+
+def _token(tokens: List[str], i: int) -> Optional[str]:
+    return tokens[i] if i < len(tokens) else None
+
+
+def _cardinal(tokens: List[str], i: int) -> Tuple[Optional[int], int]:
+    """Read a number spoken with scale words at tokens[i] ("one thousand two hundred thirty four",
+    "twelve hundred", "two thousand and five"); returns (None, 0) if there is no scale word."""
+    total, j = 0, i
+    for scale_word, scale in (('thousand', 1000), ('hundred', 100)):
+        value, used = _small_number(tokens, j)
+        if value and _token(tokens, j + used) == scale_word:
+            total += value * scale
+            j += used + 1
+    if j == i:
+        return None, 0
+    start = j + 1 if _token(tokens, j) == 'and' else j
+    rest, used = _small_number(tokens, start)
+    if rest is not None:
+        total += rest
+        j = start + used
+    return total, j - i
+
+
+def _read_group(tokens: List[str], i: int) -> Tuple[Optional[str], int, bool]:
+    """Read one spoken digit group at tokens[i]; returns (digits, tokens used, is_homophone)."""
+    token = tokens[i]
+    following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+    if token.isdigit():
+        return token, 1, False
+    if token in REPEATS and following is not None:
+        if following.isdigit() and len(following) == 1:
+            return following * REPEATS[token], 2, False
+        digit = UNITS.get(following, HOMOPHONES.get(following))
+        if digit is not None:
+            return str(digit) * REPEATS[token], 2, False
+    value, used = _cardinal(tokens, i)
+    if value is not None:
+        return str(value), used, False
+    if token in TEENS or token in TENS or token in UNITS:
+        value, used = _small_number(tokens, i)
+        return str(value), used, False
+    if token in HOMOPHONES:
+        return str(HOMOPHONES[token]), 1, True
+    return None, 0, False
+
+
+def _digit_runs(tokens: List[str]) -> List[List[Tuple[str, bool]]]:
+    """Split tokens into runs of consecutive digit groups."""
+    runs, run = [], []
+    i = 0
+    while i < len(tokens):
+        group, used, homophone = _read_group(tokens, i)
+        if group is None:
+            if run:
+                runs.append(run)
+                run = []
+            i += 1
+            continue
+        run.append((group, homophone))
+        i += used
+    if run:
+        runs.append(run)
+    # A run made only of homophones ("I'd like to pay for it") is not a number
+    return [run for run in runs if not all(homophone for _, homophone in run)]
+
+
+def _trimmed_variants(run: List[Tuple[str, bool]]) -> List[List[Tuple[str, bool]]]:
+    """The run as heard, plus versions without homophones at either end ("it's for one two three four")."""
+    start, end = 0, len(run)
+    while start < end and run[start][1]:
+        start += 1
+    while end > start and run[end - 1][1]:
+        end -= 1
+    return [run, run[start:], run[:end], run[start:end]]
+
+
+def extract_digits(text: str, length: Optional[int] = None) -> SpeechExtraction:
+    """Extract a spoken digit string, e.g. "one two three for" or "twelve thirty-four" -> "1234".
+
+    With `length`, only a single unambiguous run of exactly that many digits is confident.
+    """
+    runs = _digit_runs(tokenize(text))
+    if not runs:
+        return NOTHING
+
+    if length is None:
+        digits = "".join(group for run in runs for group, _ in run)
+        return SpeechExtraction(digits, 1.0 if len(runs) == 1 else 0.6)
+
+    matches = {}
+    for run in runs:
+        for variant in _trimmed_variants(run):
+            digits = "".join(group for group, _ in variant)
+            if len(digits) == length:
+                used_homophone = any(homophone for _, homophone in variant)
+                matches[digits] = max(matches.get(digits, 0.0), 0.85 if used_homophone else 1.0)
+    if len(matches) == 1:
+        digits, confidence = matches.popitem()
+        return SpeechExtraction(digits, confidence)
+    if matches:
+        return SpeechExtraction(None, 0.0)
+
+    # Digits split by a pause or filler word ("one two... uh... three four"): plausible but not certain
+    digits = "".join(group for run in runs for group, _ in run)
+    if len(digits) == length:
+        return SpeechExtraction(digits, 0.6)
+    return NOTHING
+
+
+def _read_day(tokens: List[str], i: int) -> Tuple[Optional[int], int]:
+    """Read a day of the month ("15", "15th", "fifteen", "fifteenth", "twenty first")."""
+    if i < len(tokens) and tokens[i] == 'the':
+        i += 1
+        skipped = 1
+    else:
+        skipped = 0
+    if i >= len(tokens):
+        return None, 0
+    token = tokens[i]
+    match = re.fullmatch(r"(\d{1,2})(?:st|nd|rd|th)?", token)
+    if match:
+        return int(match.group(1)), skipped + 1
+    if token in ORDINALS:
+        return ORDINALS[token], skipped + 1
+    following = tokens[i + 1] if i + 1 < len(tokens) else None
+    if token in TENS and following in ORDINALS and ORDINALS[following] < 10:
+        return TENS[token] + ORDINALS[following], skipped + 2
+    value, used = _small_number(tokens, i)
+    if value is not None:
+        return value, skipped + used
+    return None, 0
+
+
+def _read_year(tokens: List[str], i: int) -> Optional[int]:
+    """Read a year such as "1985", "nineteen eighty five" or "two thousand and five" at tokens[i]."""
+    if i < len(tokens) and tokens[i] == 'of':
+        i += 1
+    runs = _digit_runs(tokens[i:i + 5])
+    if not runs:
+        return None
+    digits = "".join(group for group, _ in runs[0])
+    if len(digits) == 4 and 1900 <= int(digits) <= 2100:
+        return int(digits)
+    return None
+
+
+def _build_date(year: Optional[int], month: int, day: int, today: date) -> Optional[date]:
+    try:
+        if year is not None:
+            return date(year, month, day)
+        # No year: the next occurrence, which is what payment dates mean
+        candidate = date(today.year, month, day)
+        return candidate if candidate >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def extract_date(text: str, today: Optional[date] = None) -> SpeechExtraction:
+    """Extract a spoken date as ISO "YYYY-MM-DD" ("June fifteenth nineteen eighty five", "the 20th of August", "8/20/2025")."""
+    today = today or date.today()
+    lowered = text.lower()
+
+    match = re.search(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b", lowered)
+    if match:
+        found = _build_date(int(match.group(1)), int(match.group(2)), int(match.group(3)), today)
+        return SpeechExtraction(found.isoformat(), 1.0) if found else NOTHING
+    match = re.search(r"\b(\d{1,2})[/.](\d{1,2})[/.](\d{2,4})\b", lowered)
+    if match:
+        # Month first, as Twilio transcribes en-US speech
+        year = int(match.group(3))
+        year += 2000 if year < 100 else 0
+        found = _build_date(year, int(match.group(1)), int(match.group(2)), today)
+        return SpeechExtraction(found.isoformat(), 0.9) if found else NOTHING
+
+    tokens = tokenize(lowered)
+    if 'today' in tokens:
+        return SpeechExtraction(today.isoformat(), 0.9)
+    if 'tomorrow' in tokens:
+        return SpeechExtraction((today + timedelta(days=1)).isoformat(), 0.9)
+
+    for i, token in enumerate(tokens):
+        # "may" is usually the verb; only accept it right next to a day
+        if token not in MONTHS:
+            continue
+        month = MONTHS[token]
+        # "June 15th 1985" / "June the fifteenth"
+        day, used = _read_day(tokens, i + 1)
+        year_at = i + 1 + used
+        if day is None:
+            # "15th of June 1985" / "the fifteenth of June"
+            start = i - 1
+            if start >= 0 and tokens[start] == 'of':
+                start -= 1
+            for back in (start - 1, start):
+                if back < 0:
+                    continue
+                day, used = _read_day(tokens, back)
+                if day is not None and back + used == start + 1:
+                    break
+                day = None
+            year_at = i + 1
+        if day is None or not 1 <= day <= 31:
+            continue
+        year = _read_year(tokens, year_at)
+        found = _build_date(year, month, day, today)
+        if found:
+            return SpeechExtraction(found.isoformat(), 0.9 if year else 0.8)
+    return NOTHING
+
+
+def _match_phrases(tokens: List[str], phrases: List[tuple]) -> List[Tuple[int, int]]:
+    """(start, end) spans of every phrase found in tokens."""
+    spans = []
+    for phrase in phrases:
+        size = len(phrase)
+        for i in range(len(tokens) - size + 1):
+            if tuple(tokens[i:i + size]) == phrase:
+                spans.append((i, i + size))
+    return spans
+
+
+def detect_yes_no(text: str) -> SpeechExtraction:
+    """Classify a short answer as yes (True) or no (False); extra content beyond filler lowers confidence."""
+    tokens = tokenize(text)
+    if not tokens:
+        return NOTHING
+
+    if _match_phrases(tokens, AMBIGUOUS_PHRASES):
+        return NOTHING
+    no_spans = _match_phrases(tokens, NO_PHRASES)
+    # "not correct" contains "correct"; a yes word inside a no phrase does not count
+    yes_spans = [
+        (start, end) for start, end in _match_phrases(tokens, YES_PHRASES)
+        if not any(start < no_end and no_start < end for no_start, no_end in no_spans)
+    ]
+
+    if bool(yes_spans) == bool(no_spans):
+        return NOTHING
+
+    covered = {i for start, end in yes_spans + no_spans for i in range(start, end)}
+    other = sum(1 for i, token in enumerate(tokens) if i not in covered and token not in FILLER)
+    return SpeechExtraction(bool(yes_spans), max(0.0, 1.0 - 0.15 * other))
+
+
+if __name__ == "__main__":
+    # Self-check: each sample must give the expected value confidently, or (None) not confidently at all
+    today = date(2025, 7, 1)
+    samples = [
+        ("digits", "one two three four", "1234"),
+        ("digits", "it's for one two three four", "1234"),
+        ("digits", "one two three for", "1234"),
+        ("digits", "double five six seven", "5567"),
+        ("digits", "twelve thirty-four", "1234"),
+        ("digits", "one thousand two hundred thirty four", "1234"),
+        ("digits", "twelve hundred and five", "1205"),
+        ("digits", "the last four are 1234", "1234"),
+        ("digits", "oh nine eight ate", "0988"),
+        ("digits", "one two, um, three four", None),
+        ("digits", "I'd like to pay for it", None),
+        ("date", "June fifteenth nineteen eighty five", "1985-06-15"),
+        ("date", "March the third two thousand and five", "2005-03-03"),
+        ("date", "the 20th of August", "2025-08-20"),
+        ("date", "8/20/2025", "2025-08-20"),
+        ("date", "May I ask who is calling", None),
+        ("intent", "Yes, speaking", True),
+        ("intent", "yeah that's me", True),
+        ("intent", "nope", False),
+        ("intent", "that's not right", False),
+        ("intent", "not correct", False),
+        ("intent", "wrong number", False),
+        ("intent", "I am not sure", None),
+        ("intent", "no problem", None),
+        ("intent", "not right now", None),
+        ("intent", "no, this is his wife", None),
+        ("intent", "yes but can you call back later when I'm home", None),
+    ]
+    failures = 0
+    for kind, sample, expected in samples:
+        if kind == "digits":
+            result = extract_digits(sample, length=4)
+        elif kind == "date":
+            result = extract_date(sample, today)
+        else:
+            result = detect_yes_no(sample)
+        got = result.value if result.confident else None
+        ok = got == expected
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {kind:<7} {sample!r:<50} -> {result.value!r} ({result.confidence:.2f})")
+    assert not failures, f"{failures} speech samples parsed incorrectly"
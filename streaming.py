@@ -0,0 +1,80 @@
+import queue
+import re
+from typing import List, Optional, Set
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Words that end in a period without ending the sentence
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "inc", "ltd", "jr", "sr"}
+
+_BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+class SentenceChunker:
+    """Accumulates streamed tokens and cuts them into complete sentences."""
+
+    def __init__(self, min_length: int = 2):
+        self.min_length = min_length
+        self._buffer = ""
+
+    def feed(self, token: str) -> List[str]:
+        """Add a token and return any sentences it completed."""
+        self._buffer += token
+        sentences = []
+        search_from = 0
+        while True:
+            match = _BOUNDARY.search(self._buffer, search_from)
+            if not match:
+                break
+            candidate = self._buffer[:match.end()].strip()
+            last_word = candidate.rstrip('.!?"\')]').rsplit(None, 1)[-1].lower() if candidate else ""
+            if last_word in ABBREVIATIONS or len(candidate) < self.min_length:
+                search_from = match.end()
+                continue
+            sentences.append(candidate)
+            self._buffer = self._buffer[match.end():]
+            search_from = 0
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever is left once the stream has finished."""
+        remainder = self._buffer.strip()
+        self._buffer = ""
+        return remainder or None
+
+
+class SentenceStreamHandler(BaseCallbackHandler):
+    """Pushes each complete sentence the orchestrator model streams onto a queue."""
+
+    def __init__(self, sentences: "queue.Queue", agent: str = "orchestrator"):
+        self.sentences = sentences
+        self.agent = agent
+        self.streamed_any = False
+        self._runs: Set[UUID] = set()
+        self._chunker = SentenceChunker()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        # Sub-agent runs inherit this handler from the orchestrator's run; only speak what the orchestrator says
+        if (metadata or {}).get("agent") == self.agent:
+            self._runs.add(run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs):
+        if run_id not in self._runs or not token:
+            return
+        for sentence in self._chunker.feed(token):
+            self.streamed_any = True
+            self.sentences.put(("sentence", sentence))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        if run_id not in self._runs:
+            return
+        self._runs.discard(run_id)
+        remainder = self._chunker.flush()
+        if remainder:
+            self.streamed_any = True
+            self.sentences.put(("sentence", remainder))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._runs.discard(run_id)
+        self._chunker.flush()
@@ -0,0 +1,130 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from data import ConversationMessage, ConversationState
+from prompts import SUMMARY_PROMPT
+from usage import usage_tracker
+
+SUMMARY_WORKERS = int(os.getenv('SUMMARY_WORKERS', '4'))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for prompt-size metrics."""
+    return len(text) // 4
+
+
+def format_messages(messages: List[ConversationMessage]) -> str:
+    """Format messages the same way the orchestrator sees them."""
+    formatted = []
+    for msg in messages:
+        role_prefix = "AI" if msg.role == "assistant" else "Customer"
+        step_info = f" [{msg.step}]" if msg.step else ""
+        formatted.append(f"{role_prefix}{step_info}: {msg.content}")
+    return "\n".join(formatted)
+
+
+class ConversationSummarizer:
+    """Folds messages that fall out of the history window into a rolling summary, off the turn's critical path."""
+
+    def __init__(self, model_provider: Callable[[], BaseChatModel], max_workers: int = SUMMARY_WORKERS):
+        self.model_provider = model_provider
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+        self._lock = threading.Lock()
+        self._inflight: set = set()
+        self._cancelled: set = set()
+        self._latencies: deque = deque(maxlen=1000)
+        self._stats = {
+            'runs': 0,
+            'failures': 0,
+            'cancelled': 0,
+            'messages_summarized': 0,
+            'summarized_tokens': 0,
+            'summary_tokens': 0,
+            'prompt_tokens_saved': 0,
+        }
+
+    def maybe_summarize(self, key: str, state: ConversationState, window: int):
+        """Schedule a summary update if messages have fallen out of the last `window` messages."""
+        end = len(state.conversation_history) - window
+        if end <= state.summarized_count:
+            return
+        with self._lock:
+            # One job per conversation at a time; the next message picks up anything it missed
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+        # Carry the CallSid into the worker so usage is attributed to the right call
+        self._executor.submit(contextvars.copy_context().run, self._summarize, key, state, end)
+
+    def cancel(self, key: str):
+        """Drop the pending summary for a conversation that has ended."""
+        with self._lock:
+            if key in self._inflight:
+                self._cancelled.add(key)
+
+    def _is_cancelled(self, key: str) -> bool:
+        with self._lock:
+            return key in self._cancelled
+
+    def _summarize(self, key: str, state: ConversationState, end: int):
+        started = time.perf_counter()
+        try:
+            if self._is_cancelled(key):
+                with self._lock:
+                    self._stats['cancelled'] += 1
+                return
+            new_messages = state.conversation_history[state.summarized_count:end]
+            prompt = SUMMARY_PROMPT.format_messages(
+                summary=state.context_summary or "None yet",
+                messages=format_messages(new_messages)
+            )
+            with usage_tracker.step("summary"):
+                result = self.model_provider().invoke(prompt, config=usage_tracker.config("summarizer"))
+            summary = str(result.content).strip()
+            if self._is_cancelled(key):
+                # The call ended while the model was running; its usage is still logged as late usage
+                with self._lock:
+                    self._stats['cancelled'] += 1
+                return
+
+            state.context_summary = summary
+            state.summarized_count = end
+
+            with self._lock:
+                self._stats['runs'] += 1
+                self._stats['messages_summarized'] += len(new_messages)
+                self._stats['summarized_tokens'] += estimate_tokens(format_messages(new_messages))
+                self._stats['summary_tokens'] += estimate_tokens(summary)
+                self._latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            print(f"❌ Failed to summarize conversation {key}: {str(e)}")
+            with self._lock:
+                self._stats['failures'] += 1
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+                self._cancelled.discard(key)
+
+    def record_prompt(self, state: ConversationState, window_start: int):
+        """Count the tokens a turn saved by sending the summary instead of the messages before `window_start`."""
+        if not state.context_summary or window_start <= 0:
+            return
+        folded_tokens = estimate_tokens(format_messages(state.conversation_history[:window_start]))
+        with self._lock:
+            self._stats['prompt_tokens_saved'] += max(0, folded_tokens - estimate_tokens(state.context_summary))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+            stats['inflight'] = len(self._inflight)
+        stats['avg_latency'] = sum(latencies) / len(latencies) if latencies else 0.0
+        stats['p95_latency'] = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+        return stats
@@ -1,6 +1,7 @@
 from langchain_core.tools import tool
 from typing import Dict, Any
-from data import CUSTOMER_DB, Customer, ConversationState
+from data import Customer, ConversationState
+from cache import customer_cache
 import random
 from datetime import datetime, timedelta
 
@@ -9,7 +10,7 @@ from datetime import datetime, timedelta
 @tool
 def verify_customer_identity(phone: str, verification_data: str) -> Dict[str, Any]:
     """Verify customer identity using SSN last 4 digits."""
-    customer = CUSTOMER_DB.get(phone)
+    customer = customer_cache.get(phone)
     if not customer:
         return {"success": False, "message": "Customer not found"}
 
@@ -22,7 +23,7 @@ def verify_customer_identity(phone: str, verification_data: str) -> Dict[str, An
 @tool
 def get_emi_details(phone: str) -> Dict[str, Any]:
     """Get EMI details for the customer."""
-    customer = CUSTOMER_DB.get(phone)
+    customer = customer_cache.get(phone)
     if not customer:
         return {"success": False, "message": "Customer not found"}
     
@@ -41,7 +42,7 @@ def get_emi_details(phone: str) -> Dict[str, Any]:
 @tool
 def check_overdue_status(phone: str) -> Dict[str, Any]:
     """Check if customer has any overdue payments."""
-    customer = CUSTOMER_DB.get(phone)
+    customer = customer_cache.get(phone)
     if not customer:
         return {"success": False, "message": "Customer not found"}
     
@@ -62,7 +63,7 @@ def check_overdue_status(phone: str) -> Dict[str, Any]:
 @tool
 def generate_payment_link(phone: str, amount: float) -> Dict[str, Any]:
     """Generate a secure payment link for the customer. Works for any payment method."""
-    customer = CUSTOMER_DB.get(phone)
+    customer = customer_cache.get(phone)
     if not customer:
         return {"success": False, "message": "Customer not found"}
     
@@ -83,7 +84,7 @@ def generate_payment_link(phone: str, amount: float) -> Dict[str, Any]:
 @tool
 def create_payment_plan(phone: str, monthly_amount: float, start_date: str) -> Dict[str, Any]:
     """Create a payment plan for the customer."""
-    customer = CUSTOMER_DB.get(phone)
+    customer = customer_cache.get(phone)
     if not customer:
         return {"success": False, "message": "Customer not found"}
     
@@ -92,6 +93,8 @@ def create_payment_plan(phone: str, monthly_amount: float, start_date: str) -> D
     months_needed = months_needed = int(remaining_balance / monthly_amount) + (1 if remaining_balance % monthly_amount > 0 else 0)
     
     plan_id = f"PLAN_{customer.customer_id}_{random.randint(1000, 9999)}"
+    # The plan changes what the customer owes, so the next lookup must hit the backend
+    customer_cache.invalidate(phone)
     
     return {
         "success": True,
@@ -107,7 +110,7 @@ def create_payment_plan(phone: str, monthly_amount: float, start_date: str) -> D
 @tool
 def create_escalation_ticket(phone: str, reason: str, details: str) -> Dict[str, Any]:
     """Create an escalation ticket for human intervention."""
-    customer = CUSTOMER_DB.get(phone)
+    customer = customer_cache.get(phone)
     if not customer:
         return {"success": False, "message": "Customer not found"}
     
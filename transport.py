@@ -0,0 +1,186 @@
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+import httpx
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+HTTP_PER_HOST_CONNECTIONS = int(os.getenv('HTTP_PER_HOST_CONNECTIONS', '50'))
+HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_KEEPALIVE_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '60'))
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class PooledTransport:
+    """Process-wide keep-alive HTTP pools shared by the LLM and telephony clients."""
+
+    def __init__(self, per_host_connections: int = HTTP_PER_HOST_CONNECTIONS,
+                 keepalive_connections: int = HTTP_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+                 timeout: float = HTTP_TIMEOUT):
+        self.per_host_connections = per_host_connections
+        self.keepalive_connections = keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.http2 = http2_available()
+        self._lock = threading.Lock()
+        self._llm_http_client: Optional[httpx.Client] = None
+        self._twilio_http_client: Optional[TwilioHttpClient] = None
+        self._twilio_clients: Dict[tuple, Client] = {}
+        self._llm_events: Dict[str, int] = defaultdict(int)
+
+    def llm_http_client(self) -> httpx.Client:
+        """Shared httpx client for model requests (one upstream host, so limits are per host)."""
+        with self._lock:
+            if self._llm_http_client is None:
+                self._llm_http_client = httpx.Client(
+                    http2=self.http2,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.per_host_connections,
+                        max_keepalive_connections=self.keepalive_connections,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                    event_hooks={'request': [self._trace_llm_request]},
+                )
+            return self._llm_http_client
+
+    def _trace_llm_request(self, request: httpx.Request):
+        # httpcore reports connection setup through the "trace" extension
+        request.extensions['trace'] = self._on_llm_trace
+        with self._lock:
+            self._llm_events['requests'] += 1
+
+    def _on_llm_trace(self, event_name: str, info: dict):
+        if event_name == 'connection.connect_tcp.complete':
+            key = 'connections_opened'
+        elif event_name == 'connection.start_tls.complete':
+            key = 'tls_handshakes'
+        else:
+            return
+        with self._lock:
+            self._llm_events[key] += 1
+
+    def twilio_http_client(self) -> TwilioHttpClient:
+        """Shared Twilio HTTP client backed by one keep-alive requests session."""
+        with self._lock:
+            if self._twilio_http_client is None:
+                http_client = TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+                adapter = HTTPAdapter(
+                    pool_connections=self.keepalive_connections,
+                    pool_maxsize=self.per_host_connections,
+                )
+                http_client.session.mount('https://', adapter)
+                http_client.session.mount('http://', adapter)
+                self._twilio_http_client = http_client
+            return self._twilio_http_client
+
+    def twilio_client(self, account_sid: str, auth_token: str) -> Client:
+        """Twilio REST client reused across dials instead of being rebuilt per call."""
+        http_client = self.twilio_http_client()
+        key = (account_sid, auth_token)
+        with self._lock:
+            if key not in self._twilio_clients:
+                self._twilio_clients[key] = Client(account_sid, auth_token, http_client=http_client)
+            return self._twilio_clients[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Request and connection counters for both pools."""
+        with self._lock:
+            llm = dict(self._llm_events)
+            llm_client = self._llm_http_client
+            twilio_http_client = self._twilio_http_client
+
+        llm_stats = {
+            'http2': self.http2,
+            'requests': llm.get('requests', 0),
+            'connections_opened': llm.get('connections_opened', 0),
+            'tls_handshakes': llm.get('tls_handshakes', 0),
+        }
+        if llm_client is not None:
+            pool = getattr(llm_client._transport, '_pool', None)
+            connections = list(getattr(pool, 'connections', []))
+            llm_stats['open_connections'] = len(connections)
+            llm_stats['idle_connections'] = sum(1 for c in connections if c.is_idle())
+
+        twilio_stats = {'hosts': {}}
+        if twilio_http_client is not None:
+            adapter = twilio_http_client.session.get_adapter('https://')
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                twilio_stats['hosts'][f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    'requests': pool.num_requests,
+                    'connections_opened': pool.num_connections,
+                    # The urllib3 queue is pre-filled with None placeholders up to pool_maxsize
+                    'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0,
+                }
+
+        return {
+            'per_host_connections': self.per_host_connections,
+            'keepalive_connections': self.keepalive_connections,
+            'llm': llm_stats,
+            'twilio': twilio_stats,
+        }
+
+
+transport = PooledTransport()
+
+
+if __name__ == "__main__":
+    # Self-check against local mock servers: many requests should share a handful of connections
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            body = b'{"ok": true}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    servers = [ThreadingHTTPServer(('127.0.0.1', 0), MockHandler) for _ in range(2)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm_url = f"http://127.0.0.1:{servers[0].server_port}/v1/chat/completions"
+    twilio_url = f"http://127.0.0.1:{servers[1].server_port}/2010-04-01/Calls.json"
+
+    llm_client = transport.llm_http_client()
+    twilio_http = transport.twilio_http_client()
+
+    def llm_request(_):
+        llm_client.post(llm_url, json={'model': 'mock'}).raise_for_status()
+
+    def twilio_request(_):
+        twilio_http.request('POST', twilio_url, data={'To': '+1234567890'})
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(llm_request, range(500)))
+        list(pool.map(twilio_request, range(500)))
+
+    print(json.dumps(transport.stats(), indent=2))
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,218 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig, ensure_config
+from langchain_core.runnables.config import merge_configs
+
+USAGE_LOG_PATH = os.getenv('USAGE_LOG_PATH', 'usage_log.jsonl')
+# Recently finished CallSids remembered so usage arriving after the call ends is logged, not re-opened
+FINISHED_CALLS_KEPT = int(os.getenv('FINISHED_CALLS_KEPT', '10000'))
+
+# USD per 1M tokens (input, output)
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+_current_call_sid: ContextVar[str] = ContextVar("usage_call_sid", default="unknown")
+_current_step: ContextVar[str] = ContextVar("usage_step", default="")
+
+
+def current_call_sid() -> str:
+    """CallSid that model calls in the current context are attributed to."""
+    return _current_call_sid.get()
+
+
+def _empty_counter() -> Dict[str, Any]:
+    return {
+        "model_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "cost_usd": 0.0,
+    }
+
+
+def _add_usage(counter: Dict[str, Any], prompt_tokens: int, completion_tokens: int, cost: float):
+    counter["model_calls"] += 1
+    counter["prompt_tokens"] += prompt_tokens
+    counter["completion_tokens"] += completion_tokens
+    counter["total_tokens"] += prompt_tokens + completion_tokens
+    counter["cost_usd"] += cost
+
+
+def _empty_breakdown() -> Dict[str, Any]:
+    return {"totals": _empty_counter(), "by_agent": {}, "by_step": {}}
+
+
+def _estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    for name, (input_price, output_price) in MODEL_PRICING.items():
+        if model == name or model.startswith(f"{name}-"):
+            return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+    return 0.0
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Callback handler that aggregates model usage per CallSid, agent and conversation step."""
+
+    def __init__(self, log_path: str = USAGE_LOG_PATH):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._runs: Dict[UUID, tuple] = {}
+        self._calls: Dict[str, Dict[str, Any]] = {}
+        self._finished: "OrderedDict[str, str]" = OrderedDict()
+        self._totals = _empty_breakdown()
+
+    def config(self, agent: str, callbacks: Optional[List[BaseCallbackHandler]] = None) -> RunnableConfig:
+        """Runnable config that attributes every model call of an executor to `agent`.
+
+        Built on the config inherited from the current run (e.g. the orchestrator's tool call), so a
+        sub-agent stays in its parent's run tree and keeps the parent's callbacks.
+        """
+        return merge_configs(ensure_config(), {"callbacks": [self] + (callbacks or []), "metadata": {"agent": agent}})
+
+    @contextmanager
+    def call(self, call_sid: str):
+        """Attribute model calls made inside this block to `call_sid`."""
+        token = _current_call_sid.set(call_sid or "unknown")
+        try:
+            yield
+        finally:
+            _current_call_sid.reset(token)
+
+    @contextmanager
+    def step(self, step: str):
+        """Attribute model calls made inside this block to conversation step `step`."""
+        token = _current_step.set(step or "")
+        try:
+            yield
+        finally:
+            _current_step.reset(token)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        self._start_run(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        self._start_run(run_id, metadata)
+
+    def _start_run(self, run_id: UUID, metadata: Optional[dict]):
+        metadata = metadata or {}
+        with self._lock:
+            self._runs[run_id] = (
+                _current_call_sid.get(),
+                metadata.get("agent", "unknown"),
+                _current_step.get() or "unknown",
+                metadata.get("ls_model_name", ""),
+            )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        prompt_tokens, completion_tokens, model = self._extract_usage(response)
+
+        with self._lock:
+            call_sid, agent, step, start_model = self._runs.pop(
+                run_id, (_current_call_sid.get(), "unknown", _current_step.get() or "unknown", "")
+            )
+            cost = _estimate_cost(model or start_model, prompt_tokens, completion_tokens)
+            # e.g. a background summary that finished after the call hung up
+            late = call_sid in self._finished
+            call = _empty_breakdown() if late else self._calls.setdefault(call_sid, _empty_breakdown())
+            for breakdown in (call, self._totals):
+                _add_usage(breakdown["totals"], prompt_tokens, completion_tokens, cost)
+                _add_usage(breakdown["by_agent"].setdefault(agent, _empty_counter()),
+                           prompt_tokens, completion_tokens, cost)
+                _add_usage(breakdown["by_step"].setdefault(step, _empty_counter()),
+                           prompt_tokens, completion_tokens, cost)
+            customer_phone = self._finished.get(call_sid, "")
+
+        if late:
+            self._write_record({
+                "call_sid": call_sid,
+                "customer_phone": customer_phone,
+                "ended_at": datetime.now().isoformat(),
+                "late": True,
+                **call,
+            })
+
+    @staticmethod
+    def _extract_usage(response: LLMResult) -> tuple:
+        """Read token counts from message usage metadata, falling back to provider llm_output."""
+        prompt_tokens = completion_tokens = 0
+        found = False
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    found = True
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+
+        llm_output = response.llm_output or {}
+        if not found:
+            token_usage = llm_output.get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+
+        return prompt_tokens, completion_tokens, llm_output.get("model_name", "")
+
+    def get_call_usage(self, call_sid: str) -> Optional[Dict[str, Any]]:
+        """Usage breakdown for a live call, or None if it has not used the model yet."""
+        with self._lock:
+            usage = self._calls.get(call_sid)
+            return json.loads(json.dumps(usage)) if usage else None
+
+    def get_totals(self) -> Dict[str, Any]:
+        """Process-wide usage breakdown plus how many calls are currently being tracked."""
+        with self._lock:
+            totals = json.loads(json.dumps(self._totals))
+            totals["active_calls"] = len(self._calls)
+            return totals
+
+    def finish_call(self, call_sid: str, customer_phone: str = "") -> Optional[Dict[str, Any]]:
+        """Stop tracking a call and append its usage to the usage log."""
+        with self._lock:
+            usage = self._calls.pop(call_sid, None)
+            self._finished[call_sid] = customer_phone
+            self._finished.move_to_end(call_sid)
+            while len(self._finished) > FINISHED_CALLS_KEPT:
+                self._finished.popitem(last=False)
+        if not usage:
+            return None
+
+        record = {
+            "call_sid": call_sid,
+            "customer_phone": customer_phone,
+            "ended_at": datetime.now().isoformat(),
+            **usage,
+        }
+        self._write_record(record)
+
+        totals = usage["totals"]
+        print(f"💰 Call {call_sid} used {totals['total_tokens']} tokens "
+              f"in {totals['model_calls']} model calls (${totals['cost_usd']:.4f})")
+        return record
+
+    def _write_record(self, record: Dict[str, Any]):
+        try:
+            with self._log_lock, open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"❌ Failed to write usage log: {str(e)}")
+
+
+usage_tracker = UsageTracker()